@@ -1,52 +1,127 @@
 # ------------------ IMPORTS ------------------
 import streamlit as st
-import pandas as pd
-from langchain_core.messages import HumanMessage, AIMessage
-from models.llm import get_groq_model
-from utils.rag_utils import embed_chunks, retrieve_relevant_chunks
-from utils.web_search import perform_web_search, get_completion
-import tempfile
+from models.llm import get_llm_client
+from service.core import SessionNotFoundError, ThyBotService
+from service.sync import BackgroundLoop
+from utils.context_budget import PROMPT_TOKEN_BUDGET
+from utils.lab_classifier import classify_csv_chunks, DEFAULT_REFERENCE_RANGES
+from utils.perf import export_json, export_prometheus, span, start_trace
+import io
+import json
 import os
 
-# Imports for Document Handling
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
+# The pages are thin clients of ThyBotService (service/core.py), which also backs the HTTP
+# API in service/api.py. pandas, langchain and the embedding model are imported lazily by
+# the flows that need them, so Home and Patient Profile start without loading them.
 
 # ------------------ UTILS ------------------
-def detect_thyroid_type(tsh, t3, t4):
-    if tsh > 4.0 and (t3 < 2.3 or t4 < 0.8):
-        return "Hypothyroidism"
-    elif tsh < 0.4 and (t3 > 4.2 or t4 > 1.8):
-        return "Hyperthyroidism"
-    elif 0.4 <= tsh <= 4.0 and 2.3 <= t3 <= 4.2 and 0.8 <= t4 <= 1.8:
-        return "Normal"
-    else:
-        return "Borderline / Consult Physician"
-
-def load_and_split_document(uploaded_file):
-    """Loads and splits a document based on its file type."""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
-        tmp_file_path = tmp_file.name
-
-    file_extension = os.path.splitext(uploaded_file.name)[1].lower()
-    if file_extension == ".pdf":
-        loader = PyPDFLoader(tmp_file_path)
-    elif file_extension == ".docx":
-        loader = Docx2txtLoader(tmp_file_path)
-    elif file_extension == ".txt":
-        loader = TextLoader(tmp_file_path)
-    else:
-        st.error(f"Unsupported file type: {file_extension}")
-        os.remove(tmp_file_path)
-        return None
-
-    documents = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = text_splitter.split_documents(documents)
-    os.remove(tmp_file_path)
-    return chunks
+def load_secrets():
+    # The service reads GROQ_API_KEY from the environment; on Streamlit Cloud it is a secret
+    if "GROQ_API_KEY" not in os.environ:
+        try:
+            os.environ["GROQ_API_KEY"] = st.secrets["GROQ_API_KEY"]
+        except (FileNotFoundError, KeyError):
+            pass
+
+@st.cache_resource
+def get_service():
+    # One service per process, shared by every session
+    return ThyBotService()
+
+@st.cache_resource
+def get_service_loop():
+    return BackgroundLoop()
+
+def current_session():
+    """This browser session's service session, recreated if the service expired it."""
+    service = get_service()
+    try:
+        return service.session(st.session_state.get("service_session_id"))
+    except SessionNotFoundError:
+        st.session_state.service_session_id = service.create_session()
+        session = service.session(st.session_state.service_session_id)
+        if st.session_state.get("patient_profile", {}).get("thyroid_type"):
+            session.profile = st.session_state.patient_profile
+        return session
+
+def service_events(agen):
+    return get_service_loop().iterate(agen)
+
+def render_reply_events(events):
+    """Renders a chat event stream in the current chat message, tokens as they arrive."""
+    reply_placeholder, reply = st.empty(), ""
+    placeholder = reply_placeholder  # Where status, answer and error text go
+    for event in events:
+        if event["event"] == "token":
+            reply += event["text"]
+            reply_placeholder.markdown(reply + "▌")
+            continue
+        if reply and placeholder is reply_placeholder:
+            # The streamed reply stays; whatever follows goes below it
+            reply_placeholder.markdown(reply)
+            placeholder = st.empty()
+        if event["event"] == "status":
+            placeholder.info(event["text"])
+        elif event["event"] == "answer":
+            placeholder.markdown(event["text"])
+            with st.expander("Sources"):
+                for r in event["sources"]:
+                    st.markdown(f"- [{r.get('title','Source')}]({r.get('link','#')})\n\n> {r.get('snippet','')}")
+        elif event["event"] == "error":
+            placeholder.markdown(event["message"])
+
+# st.fragment is still st.experimental_fragment on older Streamlit releases
+_fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+@_fragment(run_every=1)
+def render_ingest_progress():
+    doc_id = st.session_state.get("doc_id")
+    if doc_id is None:
+        return
+    status = get_service().document_status(current_session().id, doc_id)
+    # Rerun the whole page when chat becomes available and again when reading finishes
+    stage = "done" if status["done"] else "ready" if status["ready"] else "reading"
+    if stage != st.session_state.get("doc_ingest_stage"):
+        st.session_state.doc_ingest_stage = stage
+        st.rerun()
+    if not status["done"]:
+        text = f"Reading **{status['file_name']}**: page {status['pages_done']} of {status['total_pages'] or '?'} ({status['chunks_done']} passages indexed)"
+        st.progress(status["progress"], text=text)
+
+
+def render_prompt_budget():
+    with st.sidebar.expander("Prompt budget"):
+        stats = current_session().last_prompt_tokens
+        if not stats:
+            st.caption(f"Budget: {PROMPT_TOKEN_BUDGET} tokens. No requests yet.")
+            return
+        saved = stats["baseline"] - stats["sent"]
+        st.caption(f"Last prompt: ~{stats['sent']} of {PROMPT_TOKEN_BUDGET} tokens")
+        st.caption(f"Saved: ~{saved} tokens ({saved / stats['baseline']:.0%}) vs. unbudgeted" if stats["baseline"] else "Saved: 0 tokens")
+
+def render_llm_metrics():
+    with st.sidebar.expander("LLM client"):
+        stats = get_llm_client().metrics.snapshot()
+        st.caption(f"Requests: {stats['requests']} (+{stats['coalesced']} coalesced) | In flight: {stats['in_flight']} | Queued: {stats['queued']}")
+        st.caption(f"Latency p50/p95: {stats['latency_p50_s']:.2f}s / {stats['latency_p95_s']:.2f}s")
+        st.caption(f"Retries: {stats['retries']} | Rate-limited: {stats['rate_limited']} | Failed: {stats['failures']} | Throttled: {stats['throttle_wait_s']:.1f}s")
+
+def render_perf_panel(page):
+    with st.sidebar.expander("Performance", expanded=True):
+        trace = st.session_state.get("last_trace")
+        if trace is None:
+            st.caption("No timed requests yet.")
+        else:
+            st.caption(f"Last request ({trace.page}):")
+            st.table([{"Stage": stage, "Calls": calls, "Time (ms)": round(total * 1000, 1)}
+                      for stage, (calls, total) in trace.breakdown().items()])
+        stages = export_json().get(page, {})
+        if stages:
+            st.caption(f"{page}, all sessions:")
+            st.table([{"Stage": stage, "Count": h["count"], "p50 (ms)": round(h["p50"] * 1000, 1), "p95 (ms)": round(h["p95"] * 1000, 1)}
+                      for stage, h in stages.items()])
+        st.download_button("Export JSON", json.dumps(export_json(), indent=2), file_name="thybot_timings.json", mime="application/json")
+        st.download_button("Export Prometheus", export_prometheus(), file_name="thybot_timings.prom", mime="text/plain")
 
 
 # ------------------ PAGE FUNCTIONS ------------------
@@ -61,6 +136,7 @@ def home_page():
     - **General Chat:** Ask any question about thyroid health.
     - **Document Chat:** Upload your lab reports for a detailed analysis and ask specific questions about them.
     - **Meal Analysis:** Get personalized feedback on whether your meals are thyroid-friendly.
+    - **Bulk Lab Triage:** Classify thyroid status for a whole CSV of lab panels at once.
     """)
 
 def patient_profile_page():
@@ -92,13 +168,11 @@ def patient_profile_page():
             t4 = st.number_input("Free T4 (ng/dL)", step=0.1, format="%.2f", value=profile_data.get("t4", 0.0))
             submitted = st.form_submit_button("Save Profile")
             if submitted:
-                thyroid_type = detect_thyroid_type(tsh, t3, t4)
-                st.session_state.patient_profile = {
+                st.session_state.patient_profile = get_service().set_profile(current_session().id, {
                     "name": name, "age": age, "gender": gender,
                     "tsh": tsh, "t3": t3, "t4": t4,
-                    "thyroid_type": thyroid_type,
                     "weight": weight, "height": height, "bmi": bmi,
-                }
+                })
                 st.session_state.editing_profile = False
                 st.success(f"✅ Profile for **{name}** saved!")
                 st.rerun()
@@ -126,171 +200,107 @@ def patient_profile_page():
             st.session_state.editing_profile = True
             st.rerun()
 
-# -------------- WEB-SEARCH ------------------------
-
-LOW_CONFIDENCE_FLAGS = [
-    "i don't know", "i am not sure", "not sure", "cannot find", "no information",
-    "i don’t have enough information", "insufficient", "can't answer", "cannot answer"
-]
-
-def needs_web_search(reply: str) -> bool:
-    if not reply:
-        return True
-    text = reply.strip().lower()
-    if text == "[[need_web]]":
-        return True
-    if len(text) < 40 and any(w in text for w in ["maybe", "unsure", "unclear", "unknown"]):
-        return True
-    if any(flag in text for flag in LOW_CONFIDENCE_FLAGS):
-        return True
-    return False
-
-def summarize_search_for_thyroid(query: str, results: list) -> str:
-    if not results:
-        return "I couldn’t find reliable sources right now. Try rephrasing or a different angle."
-    lines = []
-    for i, r in enumerate(results, 1):
-        title = r.get("title", "No title")
-        snippet = r.get("snippet", "No description available.")
-        link = r.get("link", "#")
-        lines.append(f"{i}. {title} — {snippet} ({link})")
-    prompt = (
-        "You are ThyBot, a thyroid-focused assistant. Using ONLY the snippets below, write a concise, reliable answer. "
-        "Highlight consensus, note contradictions if any, and give 2–3 practical tips. "
-        "Do not invent facts beyond these snippets.\n\n" + "\n".join(lines)
-    )
-    return get_completion(prompt) or "No summary generated."
-
-
 def general_chat_page():
     st.title("General Chat")
     st.markdown("Ask anything about thyroid health.")
-
-    chat_model = get_groq_model()
-
-    if "general_messages" not in st.session_state:
-        st.session_state.general_messages = []
+    service = get_service()
+    session = current_session()
 
     if st.sidebar.button("Clear Chat History"):
-        st.session_state.general_messages = []
+        service.clear_chat(session.id)
         st.rerun()
 
     # Render previous messages
-    for message in st.session_state.general_messages:
+    for message in session.general_messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
     if prompt := st.chat_input("What would you like to know?"):
-        st.session_state.general_messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
-
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                profile = st.session_state.get("patient_profile", {})
-                thyroid_type = profile.get("thyroid_type", "Not specified")
-                response_style = st.session_state.get("response_mode", "Detailed")
-
-                # System message tells LLM to signal [[NEED_WEB]] if unsure
-                system_message = (
-                    "You are ThyBot, an expert AI assistant for thyroid health. "
-                    f"The user's thyroid status is '{thyroid_type}'. "
-                    f"Your response style should be {response_style}. "
-                    "If you are NOT reasonably certain based on your internal knowledge, reply EXACTLY with [[NEED_WEB]] and nothing else."
-                )
-
-                messages_for_llm = [{"role": "system", "content": system_message}]
-                # Keep recent history short to avoid long context
-                for msg in st.session_state.general_messages[-8:]:
-                    messages_for_llm.append({"role": msg["role"], "content": msg["content"]})
-
-            
-                try:
-                    response = chat_model.invoke(messages_for_llm)
-                    reply = response.content if hasattr(response, "content") else str(response)
-                except Exception as e:
-                    reply = f"⚠️ Error generating response: {e}"
-
-            
-                if needs_web_search(reply):
-                    try:
-                        results = perform_web_search(prompt, max_results=6)
-                        summary = summarize_search_for_thyroid(prompt, results)
-                        st.markdown(summary)
-                        with st.expander("Sources"):
-                            for r in results:
-                                st.markdown(f"- [{r.get('title','Source')}]({r.get('link','#')})\n\n> {r.get('snippet','')}")
-                        st.session_state.general_messages.append({"role": "assistant", "content": summary})
-                    except Exception as e:
-                        fallback_msg = f"⚠️ Web search failed: {e}"
-                        st.markdown(fallback_msg)
-                        st.session_state.general_messages.append({"role": "assistant", "content": fallback_msg})
-                else:
-                    st.markdown(reply)
-                    st.session_state.general_messages.append({"role": "assistant", "content": reply})
+                events = service_events(service.chat(
+                    session.id, prompt,
+                    response_style=st.session_state.get("response_mode", "Detailed"),
+                    speculative_search=st.session_state.get("speculative_search", False),
+                ))
+                # Wait for the first event inside the spinner; the rest streams in below
+                first = next(events)
+            render_reply_events(_chain_first(first, events))
+
+    render_prompt_budget()
+    render_llm_metrics()
+
+def _chain_first(first, rest):
+    yield first
+    yield from rest
 
 def document_chat_page():
     st.title("Document Chat")
     st.markdown("Upload a document (`PDF`, `DOCX`, `TXT`) to ask specific questions about its contents. This chat will focus *only* on the document.")
-    chat_model = get_groq_model()
+    service = get_service()
+    session = current_session()
 
     uploaded_file = st.file_uploader("Upload a document", type=["pdf", "docx", "txt"], label_visibility="collapsed")
-    
-    if uploaded_file and "doc_faiss_index" not in st.session_state:
-        with st.spinner("Processing document..."):
-            chunks = load_and_split_document(uploaded_file)
-            if chunks:
-                st.session_state.doc_faiss_index = embed_chunks(chunks)
-                st.session_state.doc_messages = [{"role": "assistant", "content": f"I've finished reading **{uploaded_file.name}**. What would you like to know?"}]
-                st.session_state.uploaded_file_name = uploaded_file.name
-
-    if "doc_faiss_index" in st.session_state:
-        st.info(f"Currently chatting with **{st.session_state.uploaded_file_name}**.")
-        for message in st.session_state.doc_messages:
+
+    if st.session_state.get("doc_id") not in session.documents:
+        st.session_state.pop("doc_id", None)  # The service session expired
+    if uploaded_file and "doc_id" not in st.session_state:
+        status = get_service_loop().run(service.upload_document(session.id, uploaded_file.name, uploaded_file.getvalue()))
+        st.session_state.doc_id = status["document_id"]
+        st.session_state.doc_ingest_stage = None
+        if status["done"]:
+            greeting = f"I've finished reading **{uploaded_file.name}**. What would you like to know?"
+        else:
+            greeting = f"I'm reading **{uploaded_file.name}**. You can start asking questions as soon as the first pages are indexed."
+        session.document_messages[status["document_id"]].append({"role": "assistant", "content": greeting})
+
+    if "doc_id" in st.session_state:
+        doc_id = st.session_state.doc_id
+        status = service.document_status(session.id, doc_id)
+        if status["error"]:
+            st.error(f"Couldn't process **{status['file_name']}**: {status['error']}")
+        else:
+            render_ingest_progress()
+            st.info(f"Currently chatting with **{status['file_name']}**.")
+        for message in session.document_messages[doc_id]:
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
-        if prompt := st.chat_input("Ask a question about the document..."):
-            st.session_state.doc_messages.append({"role": "user", "content": prompt})
+        if status["ready"] and (prompt := st.chat_input("Ask a question about the document...")):
             with st.chat_message("user"):
                 st.markdown(prompt)
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
-                    profile = st.session_state.get("patient_profile", {})
-                    thyroid_type = profile.get("thyroid_type", "Not specified")
-                    response_style = st.session_state.get("response_mode", "Detailed")
-                    
-                    docs = retrieve_relevant_chunks(prompt, st.session_state["doc_faiss_index"])
-                    context = "\n\n".join([doc.page_content for doc in docs])
-                    
-                    system_message_content = (f"You are ThyBot, an expert AI assistant. Answer questions based ONLY on the provided document context. "
-                                              f"The user's thyroid status is '{thyroid_type}'. Your response style should be {response_style}.\n\n"
-                                              f"CONTEXT:\n---\n{context}")
-                    
-                    messages_for_llm = [{"role": "system", "content": system_message_content}, {"role": "user", "content": prompt}]
-                    response = chat_model.invoke(messages_for_llm)
-                    reply = response.content if hasattr(response, "content") else str(response)
-                    st.markdown(reply)
-                    st.session_state.doc_messages.append({"role": "assistant", "content": reply})
+                    events = service_events(service.ask_document(
+                        session.id, doc_id, prompt, response_style=st.session_state.get("response_mode", "Detailed"),
+                    ))
+                    first = next(events)
+                render_reply_events(_chain_first(first, events))
         if st.button("End Document Chat Session"):
-            if "doc_faiss_index" in st.session_state: del st.session_state["doc_faiss_index"]
-            if "doc_messages" in st.session_state: del st.session_state["doc_messages"]
-            if "uploaded_file_name" in st.session_state: del st.session_state["uploaded_file_name"]
+            service.end_document(session.id, doc_id)
+            for key in ["doc_id", "doc_ingest_stage"]:
+                if key in st.session_state: del st.session_state[key]
             st.rerun()
     else:
         st.info("Upload a file to start the document chat.")
 
+    render_prompt_budget()
+    render_llm_metrics()
+    with st.sidebar.expander("Embedding cache"):
+        stats = service.embedding_cache.stats()
+        st.caption(f"Hits: {stats['hits']} | Misses: {stats['misses']} | Hit rate: {stats['hit_rate']:.0%}")
+        st.caption(f"{stats['entries']} documents, {stats['size_mb']:.1f} / {stats['max_mb']:.0f} MB, {stats['evictions']} evicted")
+
 def meal_analysis_page():
     st.title("Meal Analysis")
-    st.markdown("Select food items from a list to analyze the impact on your thyroid health. This analysis is personalized using your patient profile.")
-    chat_model = get_groq_model()
-    @st.cache_data
-    def load_food_data():
-        df = pd.read_csv("data/Indian_Food_Nutrition_Processed.csv")
-        return df
-    df = load_food_data()
-    food_list = [""] + sorted(df['Dish Name'].tolist())
+    st.markdown("Select food items from a list, or describe your meal, to analyze the impact on your thyroid health. This analysis is personalized using your patient profile.")
+    service = get_service()
+    catalog = service.catalog
     if "meal_items" not in st.session_state:
         st.session_state.meal_items = []
+    if "meal_quantities" not in st.session_state:
+        st.session_state.meal_quantities = {}
     profile = st.session_state.get("patient_profile", {})
     thyroid_type = profile.get("thyroid_type", "Not set")
     if thyroid_type == "Not set":
@@ -298,10 +308,33 @@ def meal_analysis_page():
         st.stop()
     else:
         st.info(f"Analyzing meals for a patient with: **{thyroid_type}**")
-    new_item = st.selectbox("Select a food item to add to your meal:", options=food_list)
+    new_item = st.selectbox("Select a food item to add to your meal:", options=catalog.sorted_names, index=None, placeholder="Choose a dish")
     if st.button("Add Item") and new_item and new_item not in st.session_state.meal_items:
         st.session_state.meal_items.append(new_item)
         st.rerun()
+    meal_text = st.text_input("Or describe your meal:", placeholder="2 rotis, dal and paneer")
+    if st.button("Add from Description") and meal_text:
+        unmatched, ambiguous, defaulted = [], [], []
+        for part, quantity, dish, candidates in catalog.parse_meal(meal_text):
+            if dish is None:
+                # Not in the catalog, or too vague to pick a dish: keep it, tagged from its name alone
+                dish = part
+                if candidates:
+                    ambiguous.append(f"**{part}**: {', '.join(candidates)}")
+                else:
+                    unmatched.append(part)
+            elif candidates:
+                # A plain word read as its plain dish ("dal" -> "Mixed dal"); the others are still offered
+                defaulted.append(f"**{part}** → {dish} (or {', '.join(candidates)})")
+            if dish not in st.session_state.meal_items:
+                st.session_state.meal_items.append(dish)
+            st.session_state.meal_quantities[dish] = quantity
+        if unmatched:
+            st.warning(f"Not in our food database: {', '.join(unmatched)}. Thyroid impact is estimated from the name and nutrients are unavailable.")
+        if defaulted:
+            st.info("Read as the plain dish. If you meant another, remove it and pick from the list above:\n\n" + "\n\n".join(defaulted))
+        if ambiguous:
+            st.info("These could be several dishes, so they were added by name without nutrients. Pick the closest from the list above to get nutrients:\n\n" + "\n\n".join(ambiguous))
     st.markdown("---")
     st.markdown("#### Your Current Meal")
     if not st.session_state.meal_items:
@@ -310,28 +343,82 @@ def meal_analysis_page():
         for i, item in enumerate(st.session_state.meal_items):
             col1, col2 = st.columns([0.9, 0.1])
             with col1:
-                st.markdown(f"- **{item}**")
+                quantity = st.session_state.meal_quantities.get(item, 1)
+                st.markdown(f"- **{item}**" + (f" × {quantity:g}" if quantity != 1 else ""))
             with col2:
                 if st.button("✖️", key=f"remove_{i}", help="Remove item"):
                     st.session_state.meal_items.pop(i)
+                    st.session_state.meal_quantities.pop(item, None)
                     st.rerun()
+        totals = catalog.meal_totals({item: st.session_state.meal_quantities.get(item, 1) for item in st.session_state.meal_items if item in catalog.row_by_name})
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Calories", f"{totals['Calories (kcal)']:.0f} kcal")
+        c2.metric("Protein", f"{totals['Protein (g)']:.1f} g")
+        c3.metric("Carbs", f"{totals['Carbohydrates (g)']:.1f} g")
+        c4.metric("Sugar", f"{totals['Free Sugar (g)']:.1f} g")
+    batch_mode = st.checkbox("Analyze the whole meal in a single request", help="Uses one structured prompt for all items instead of one request per item.")
     if st.session_state.meal_items and st.button("🍽️ Analyze Meal"):
+        # One slot per item so results keep the meal order while arriving out of order
+        placeholders = {item: st.empty() for item in st.session_state.meal_items}
+        events = service_events(service.analyze_meal(
+            list(st.session_state.meal_items), thyroid_type, quantities=st.session_state.meal_quantities, batch=batch_mode,
+        ))
         with st.spinner("Analyzing your meal..."):
-            for item in st.session_state.meal_items:
-                match = df[df['Dish Name'] == item]
-                row = match.iloc[0]
-                nutrients = f"Calories: {row['Calories (kcal)']:.0f} kcal | Protein: {row['Protein (g)']}g | Sugar: {row['Free Sugar (g)']}g"
-                impact = row['Thyroid_Impact']
-                prompt = (f"A patient with '{thyroid_type}' is eating '{item}'. Its known thyroid impact is '{impact}' and its nutrients are: {nutrients}. Briefly explain if this food is generally beneficial, neutral, or should be consumed with caution for their condition and why. Provide one simple suggestion for a healthy pairing or alternative.")
-                response = chat_model.invoke(prompt)
-                reply = response.content if hasattr(response, "content") else str(response)
-                with st.expander(f"Analysis for: **{item}**", expanded=True):
-                    st.info(f"**Thyroid Impact:** {impact} | **Nutrients:** {nutrients}")
-                    st.markdown(reply)
+            for event in events:
+                if event["event"] != "item":
+                    continue
+                with placeholders[event["item"]].container():
+                    with st.expander(f"Analysis for: **{event['item']}**", expanded=True):
+                        st.info(f"**Thyroid Impact:** {event['impact']} | **Nutrients:** {event['nutrients']}")
+                        st.markdown(event["analysis"] or event["error"])
+
+def bulk_lab_triage_page():
+    st.title("Bulk Lab Triage")
+    st.markdown("Upload a CSV of lab panels (one row per patient) to classify thyroid status for all of them at once.")
+    uploaded_file = st.file_uploader("Upload lab panels", type=["csv"], label_visibility="collapsed")
+    if not uploaded_file:
+        st.info("The CSV needs one column each for TSH, Free T3 and Free T4.")
+        return
+
+    import pandas as pd
+    header = pd.read_csv(uploaded_file, nrows=0).columns.tolist()
+    col1, col2, col3 = st.columns(3)
+    tsh_col = col1.selectbox("TSH column", header, index=header.index("TSH") if "TSH" in header else 0)
+    t3_col = col2.selectbox("Free T3 column", header, index=header.index("T3") if "T3" in header else 0)
+    t4_col = col3.selectbox("Free T4 column", header, index=header.index("T4") if "T4" in header else 0)
+
+    with st.expander("Reference ranges"):
+        ranges = {}
+        for analyte, label in [("tsh", "TSH (mIU/L)"), ("t3", "Free T3 (pg/mL)"), ("t4", "Free T4 (ng/dL)")]:
+            lo, hi = DEFAULT_REFERENCE_RANGES[analyte]
+            c1, c2 = st.columns(2)
+            ranges[analyte] = (
+                c1.number_input(f"{label} low", value=lo, step=0.1, format="%.2f"),
+                c2.number_input(f"{label} high", value=hi, step=0.1, format="%.2f"),
+            )
+
+    if st.button("Classify Panels"):
+        uploaded_file.seek(0)
+        output = io.StringIO()
+        counts = {}
+        rows = 0
+        progress = st.progress(0.0, text="Classifying...")
+        total = max(uploaded_file.size, 1)
+        for i, chunk in enumerate(classify_csv_chunks(uploaded_file, chunksize=50_000, columns=(tsh_col, t3_col, t4_col), ranges=ranges)):
+            chunk.to_csv(output, header=i == 0, index=False)
+            for status, n in chunk["Thyroid_Type"].value_counts().items():
+                counts[status] = counts.get(status, 0) + int(n)
+            rows += len(chunk)
+            progress.progress(min(uploaded_file.tell() / total, 1.0), text=f"Classified {rows:,} panels")
+        progress.empty()
+        st.success(f"Classified **{rows:,}** panels.")
+        st.dataframe(pd.DataFrame(sorted(counts.items()), columns=["Thyroid Status", "Patients"]), hide_index=True)
+        st.download_button("Download Results", output.getvalue(), file_name="classified_panels.csv", mime="text/csv")
 
 # ------------------ MAIN ------------------
 def main():
     st.set_page_config(page_title="ThyBot", page_icon="assets/logo.png", layout="centered")
+    load_secrets()
 
     with st.sidebar:
         st.image("assets/logo.png", width=150)
@@ -342,25 +429,45 @@ def main():
             help="Choose how you want the AI to respond in the chat sessions."
         )
         st.session_state.response_mode_index = ["Concise", "Detailed"].index(st.session_state.response_mode)
+        st.session_state.speculative_search = st.toggle(
+            "Speculative web search",
+            value=st.session_state.get("speculative_search", False),
+            help="Start the web search alongside the AI answer so fallbacks arrive sooner."
+        )
+        st.session_state.show_perf = st.toggle(
+            "Performance panel",
+            value=st.session_state.get("show_perf", False),
+            help="Show where the time went in the last request."
+        )
         
         st.markdown("---")
         st.markdown("### Navigation")
         page = st.radio(
             "Navigation",
-            ["Home", "Patient Profile", "General Chat", "Document Chat", "Meal Analysis"],
+            ["Home", "Patient Profile", "General Chat", "Document Chat", "Meal Analysis", "Bulk Lab Triage"],
             label_visibility="collapsed"
         )
 
-    if page == "Home":
-        home_page()
-    elif page == "Patient Profile":
-        patient_profile_page()
-    elif page == "General Chat":
-        general_chat_page()
-    elif page == "Document Chat":
-        document_chat_page()
-    elif page == "Meal Analysis":
-        meal_analysis_page()
+    # Every span recorded during this run (and in threads it starts) is labelled with the page
+    trace = start_trace(page)
+    with span("page.render"):
+        if page == "Home":
+            home_page()
+        elif page == "Patient Profile":
+            patient_profile_page()
+        elif page == "General Chat":
+            general_chat_page()
+        elif page == "Document Chat":
+            document_chat_page()
+        elif page == "Meal Analysis":
+            meal_analysis_page()
+        elif page == "Bulk Lab Triage":
+            bulk_lab_triage_page()
+    # Runs that only redrew the page (no stage besides page.render) don't replace the last request
+    if len(trace.breakdown()) > 1:
+        st.session_state.last_trace = trace
+    if st.session_state.show_perf:
+        render_perf_panel(page)
 
 # ------------------ LAUNCH ------------------
 if __name__ == "__main__":
@@ -1,23 +1,70 @@
 # models/llm.py
 
-import streamlit as st
-from groq import Groq
+import os
+import threading
 
-# Load GROQ API key from Streamlit secrets
-GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
+from models.llm_client import ResilientLLMClient
+from utils.perf import span, timed_stream
 
-# Initialize Groq client
-client = Groq(api_key=GROQ_API_KEY)
+MODEL_NAME = "llama3-70b-8192"
+# Point at any server speaking the Groq/OpenAI chat-completions API (self-hosted stand-in, proxy)
+LLM_BASE_URL = os.environ.get("THYBOT_LLM_BASE_URL") or None
+LLM_TIMEOUT = float(os.environ.get("THYBOT_LLM_TIMEOUT", "30"))
+# Defaults match Groq's free-tier quota for llama3-70b
+LLM_MAX_CONCURRENCY = int(os.environ.get("THYBOT_LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("THYBOT_LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("THYBOT_LLM_TOKENS_PER_MINUTE", "6000"))
+LLM_MAX_RETRIES = int(os.environ.get("THYBOT_LLM_MAX_RETRIES", "4"))
+
+_groq_client = None
+_groq_client_lock = threading.Lock()
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def get_groq_client():
+    # Created on first use and shared by every session in the process
+    global _groq_client
+    with _groq_client_lock:
+        if _groq_client is None:
+            from groq import Groq
+            api_key = os.environ.get("GROQ_API_KEY")
+            if not api_key:
+                raise RuntimeError("GROQ_API_KEY is not set")
+            # Retries are handled by get_llm_client, which knows about the shared rate limits
+            _groq_client = Groq(api_key=api_key, base_url=LLM_BASE_URL, timeout=LLM_TIMEOUT, max_retries=0)
+        return _groq_client
+
+def get_llm_client():
+    """The process-wide client every session's LLM calls go through."""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = ResilientLLMClient(
+                get_groq_client().chat.completions.create,
+                max_concurrency=LLM_MAX_CONCURRENCY,
+                requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                max_retries=LLM_MAX_RETRIES,
+            )
+        return _llm_client
+
+def _as_messages(prompt_or_messages):
+    # Convert string to message format if needed
+    if isinstance(prompt_or_messages, str):
+        return [{"role": "user", "content": prompt_or_messages}]
+    return prompt_or_messages
 
 def get_groq_model():
     class GroqWrapper:
+        def __init__(self):
+            # Resolved here, on the script thread, so worker threads reuse it
+            self.client = get_llm_client()
+
         def invoke(self, prompt_or_messages):
-            # Convert string to message format if needed
-            if isinstance(prompt_or_messages, str):
-                prompt_or_messages = [{"role": "user", "content": prompt_or_messages}]
-            response = client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=prompt_or_messages
-            )
-            return response.choices[0].message.content
+            with span("llm.complete"):
+                return self.client.complete(_as_messages(prompt_or_messages), model=MODEL_NAME)
+
+        def stream(self, prompt_or_messages):
+            """Yields the completion incrementally as text deltas."""
+            return timed_stream("llm.stream", self.client.stream(_as_messages(prompt_or_messages), model=MODEL_NAME))
     return GroqWrapper()
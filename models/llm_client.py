@@ -0,0 +1,210 @@
+# models/llm_client.py
+
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from utils.context_budget import messages_tokens
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when the LLM keeps failing with retryable errors (rate limits, timeouts, 5xx)."""
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after_seconds(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def close_response(response):
+    close = getattr(response, "close", None)
+    if close is not None:
+        close()
+
+
+class TokenBucket:
+    """Thread-safe token bucket: holds up to capacity tokens, refilled at capacity per period seconds."""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1.0):
+        """Blocks until amount tokens are available and takes them; returns the seconds waited."""
+        amount = min(float(amount), self.capacity)  # Oversized requests wait for a full bucket, not forever
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class LLMMetrics:
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.queued = 0
+        self.in_flight = 0
+        self.throttle_wait_s = 0.0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            stats = {name: getattr(self, name) for name in (
+                "requests", "coalesced", "retries", "rate_limited", "failures", "queued", "in_flight", "throttle_wait_s")}
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+        stats.update(latency_p50_s=percentile(0.50), latency_p95_s=percentile(0.95))
+        return stats
+
+
+class ResilientLLMClient:
+    """Wraps a chat-completions create() call with the policies a shared client needs.
+
+    - at most max_concurrency requests in flight; callers beyond that queue
+    - token buckets for requests/minute and tokens/minute, sized to the provider quota
+    - retries with full-jitter exponential backoff on 429/5xx/timeouts, honouring Retry-After
+    - identical concurrent complete() calls share one upstream request
+    """
+
+    def __init__(self, create, max_concurrency=8, requests_per_minute=30, tokens_per_minute=6000,
+                 max_retries=4, backoff_base=0.5, backoff_cap=20.0, completion_tokens=256):
+        self._create = create
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.completion_tokens = completion_tokens
+        self.metrics = LLMMetrics()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _backoff(self, attempt, error):
+        # Capped even when the server asks for longer: the sleep holds one of the concurrency slots
+        return min(self.backoff_cap, retry_after_seconds(error) or random.uniform(0, self.backoff_base * 2 ** attempt))
+
+    @contextmanager
+    def _slot(self):
+        self.metrics.add(queued=1)
+        self._slots.acquire()
+        self.metrics.add(queued=-1, in_flight=1, requests=1)
+        try:
+            yield
+        finally:
+            self.metrics.add(in_flight=-1)
+            self._slots.release()
+
+    def _retrying(self, messages, call):
+        """Runs call() under the rate limits, retrying retryable errors with backoff."""
+        cost = messages_tokens(messages) + self.completion_tokens
+        for attempt in range(self.max_retries + 1):
+            waited = self._requests.acquire() + self._tokens.acquire(cost)
+            if waited:
+                self.metrics.add(throttle_wait_s=waited)
+            try:
+                return call()
+            except Exception as e:
+                if getattr(e, "status_code", None) == 429:
+                    self.metrics.add(rate_limited=1)
+                if not is_retryable(e):
+                    self.metrics.add(failures=1)
+                    raise
+                if attempt == self.max_retries:
+                    self.metrics.add(failures=1)
+                    raise LLMUnavailableError(
+                        "ThyBot's AI service is busy right now. Please try again in a few seconds."
+                    ) from e
+                self.metrics.add(retries=1)
+                time.sleep(self._backoff(attempt, e))
+
+    def complete(self, messages, **params):
+        key = json.dumps([messages, params], sort_keys=True)
+        with self._inflight_lock:
+            shared = self._inflight.get(key)
+            if shared is None:
+                future = self._inflight[key] = Future()
+        if shared is not None:
+            self.metrics.add(coalesced=1)
+            return shared.result()
+        try:
+            start = time.perf_counter()
+            with self._slot():
+                result = self._retrying(
+                    messages, lambda: self._create(messages=messages, **params).choices[0].message.content
+                )
+            self.metrics.record_latency(time.perf_counter() - start)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def stream(self, messages, **params):
+        """Yields text deltas. Retries happen only before the first chunk arrives."""
+
+        def open_stream():
+            response = self._create(messages=messages, stream=True, **params)
+            try:
+                chunks = iter(response)
+                return response, next(chunks, None), chunks
+            except BaseException:
+                close_response(response)
+                raise
+
+        start = time.perf_counter()
+        with self._slot():
+            response, first, chunks = self._retrying(messages, open_stream)
+            try:
+                if first is not None:
+                    for chunk in itertools.chain([first], chunks):
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            yield delta
+            finally:
+                # A consumer that stops early (disconnect, [[NEED_WEB]]) must not leave the HTTP response open
+                close_response(response)
+        self.metrics.record_latency(time.perf_counter() - start)
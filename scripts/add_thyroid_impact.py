@@ -1,20 +1,21 @@
-import pandas as pd
+import argparse
+import os
+import sys
 
-df = pd.read_csv("data/Indian_Food_Nutrition_Processed.csv")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-goitrogenic = ["cabbage", "cauliflower", "spinach", "broccoli", "mustard", "soy", "tofu", "peanut", "radish"]
-thyroid_supportive = ["fish", "egg", "milk", "yogurt", "curd", "cheese", "iodized salt", "brazil nut", "almond", "cashew"]
+from utils.thyroid_tagger import tag_csv
 
-def tag_thyroid_impact(food):
-    f = str(food).lower()
-    if any(g in f for g in goitrogenic):
-        return "Goitrogenic – Limit in Hypothyroidism"
-    elif any(s in f for s in thyroid_supportive):
-        return "Thyroid Supportive – Good for Thyroid Health"
-    else:
-        return "Neutral – No major thyroid impact"
+parser = argparse.ArgumentParser(description="Add a Thyroid_Impact column to a food CSV.")
+parser.add_argument("--input", default="data/Indian_Food_Nutrition_Processed.csv")
+parser.add_argument("--output", default="data/Indian_Food_Nutrition_Tagged.parquet",
+                    help="Output file; .parquet or .csv. Never the same file as --input.")
+parser.add_argument("--column", default="Dish Name", help="Column holding the dish names.")
+parser.add_argument("--chunksize", type=int, default=100_000)
+args = parser.parse_args()
 
-df["Thyroid_Impact"] = df["Dish Name"].apply(tag_thyroid_impact)
+if os.path.abspath(args.input) == os.path.abspath(args.output):
+    parser.error("--output must differ from --input")
 
-df.to_csv("data/Indian_Food_Nutrition_Processed.csv", index=False)
-print("Thyroid_Impact column added successfully!")
+rows = tag_csv(args.input, args.output, column=args.column, chunksize=args.chunksize)
+print(f"Thyroid_Impact column added to {rows} rows in {args.output}!")
@@ -0,0 +1,257 @@
+"""End-to-end benchmark of the General Chat, Document Chat and Meal Analysis flows, fully offline.
+
+Groq and DuckDuckGo are replaced by local fakes (scripts/offline_fakes.py) with configurable
+latency and token rate. The flows run headlessly through ThyBotService, the layer behind the pages.
+Each flow runs in a fresh process with --users concurrent sessions. The report covers:
+- requests/s and end-to-end latency percentiles;
+- peak RSS;
+- the per-stage timings from utils/perf.py;
+- ingest throughput for Document Chat.
+
+Results are written to JSON. Pass an earlier file to --compare to see what changed.
+
+Run from the repo root:  python scripts/benchmark_e2e.py [--flows general,document,meal] [--users 4]
+                         [--requests 20] [--llm-latency 0.3] [--tokens-per-second 200] [--fake-embeddings]
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FLOWS = {"general": "General Chat", "document": "Document Chat", "meal": "Meal Analysis"}
+
+QUESTIONS = [
+    "What does a high TSH level mean?",
+    "Can hypothyroidism cause weight gain?",
+    "Which foods should I avoid with Hashimoto's?",
+    "How long does levothyroxine take to work?",
+    "Is it safe to exercise with hyperthyroidism?",
+    "What is the difference between free T3 and free T4?",
+    "Can thyroid problems affect my sleep?",
+    "How often should thyroid levels be checked during pregnancy?",
+]
+DOCUMENT_QUESTIONS = [
+    "How are thyroid nodules evaluated?",
+    "What treatment options are described for hyperthyroidism?",
+    "Which symptoms are common in older patients?",
+    "What do the guidelines say about iodine during pregnancy?",
+    "When is a biopsy recommended?",
+]
+MEALS = [
+    "2 rotis, dal and paneer",
+    "cabbage sabzi and rice",
+    "poha with a glass of milk",
+    "1 bowl of rajma and 2 chapatis",
+    "upma, coconut chutney and tea",
+]
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.asarray(samples)
+    return {f"p{p}": float(np.percentile(values, p)) for p in (50, 90, 95, 99)} | {"max": float(values.max())}
+
+
+# ------------------ FLOWS ------------------
+# Each flow drives ThyBotService (the layer behind the pages and the HTTP API) and returns a
+# per-user session factory and a request function (session, i) -> None.
+
+def general_flow(args, service, loop):
+    def request(session_id, i):
+        prompt = QUESTIONS[i % len(QUESTIONS)]
+        for _ in loop.iterate(service.chat(session_id, prompt, thyroid_type="Hypothyroidism", response_style="Concise",
+                                           speculative_search=args.speculative_search)):
+            pass
+
+    return service.create_session, request, {}
+
+
+def document_flow(args, service, loop):
+    session_id = service.create_session()
+    paths = sorted(glob.glob(os.path.join(ROOT, "data", "*.pdf")))[:args.documents]
+    doc_ids, ingest = [], {"documents": len(paths), "pages": 0, "chunks": 0}
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            doc_id = loop.run(service.upload_document(session_id, os.path.basename(path), f.read()))["document_id"]
+        job = service.session(session_id).documents[doc_id]
+        job.wait()
+        if job.error:
+            raise job.error
+        doc_ids.append(doc_id)
+        ingest["pages"] += job.total_pages
+        ingest["chunks"] += job.chunks_done
+    ingest["seconds"] = time.perf_counter() - start
+    ingest["pages_per_s"] = ingest["pages"] / ingest["seconds"]
+
+    def request(_, i):
+        prompt = DOCUMENT_QUESTIONS[i % len(DOCUMENT_QUESTIONS)]
+        for _ in loop.iterate(service.ask_document(session_id, doc_ids[i % len(doc_ids)], prompt, thyroid_type="Hypothyroidism",
+                                                   response_style="Concise")):
+            pass
+
+    return lambda: None, request, {"ingest": ingest}
+
+
+def meal_flow(args, service, loop):
+    def request(_, i):
+        items = [dish for dish, _, _ in service.parse_meal(MEALS[i % len(MEALS)])]
+        service.meal_memo.clear()  # No memo: every request exercises the LLM path
+        for _ in loop.iterate(service.analyze_meal(items, "Hypothyroidism", batch=args.meal_batch)):
+            pass
+
+    return lambda: None, request, {}
+
+
+# ------------------ RUNNER ------------------
+
+def run_flow(name, args):
+    """Runs one flow in this process and returns its results."""
+    from offline_fakes import FakeGroq, install
+    llm = FakeGroq(latency=args.llm_latency, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+                   need_web_rate=args.need_web_rate, error_rate=args.error_rate)
+    install(llm, search_latency=args.search_latency, fake_embeddings=args.fake_embeddings)
+
+    from models.llm import get_llm_client
+    from service.core import ThyBotService
+    from service.sync import BackgroundLoop
+    from utils.embedding_cache import EmbeddingCache
+    from utils.perf import export_json, start_trace
+
+    page = FLOWS[name]
+    start_trace(page)
+    # A throwaway embedding cache, so documents are ingested cold on every run
+    service = ThyBotService(embedding_cache=EmbeddingCache(tempfile.mkdtemp(prefix="thybot-bench-")))
+    flow = {"general": general_flow, "document": document_flow, "meal": meal_flow}[name]
+    new_session, request, extra = flow(args, service, BackgroundLoop())
+    setup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    latencies, errors, lock = [], [], threading.Lock()
+
+    def user(u):
+        start_trace(page)
+        session = new_session()
+        for r in range(args.requests):
+            t = time.perf_counter()
+            try:
+                request(session, u * args.requests + r)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    stages = export_json().get(page, {})
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "latency_s": percentiles(latencies),
+        "setup_peak_rss_mb": setup_rss,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": {stage: {k: h[k] for k in ("count", "p50", "p95")} for stage, h in stages.items()},
+        "llm_client": get_llm_client().metrics.snapshot(),
+        "llm_calls": llm.calls,
+        **extra,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(previous, current):
+    print(f"\nvs. {previous['commit']} ({previous['timestamp']}):")
+    for name, now in current["flows"].items():
+        before = previous.get("flows", {}).get(name)
+        if not before or "latency_s" not in before or "latency_s" not in now:
+            continue
+        for label, key in (("throughput", "throughput_rps"), ("peak RSS", "peak_rss_mb")):
+            print(f"  {name:<10}{label:<12}{before[key]:>10.2f} -> {now[key]:>10.2f} ({now[key] / before[key] - 1:+.1%})")
+        for p in ("p50", "p95"):
+            b, n = before["latency_s"].get(p), now["latency_s"].get(p)
+            if b and n:
+                print(f"  {name:<10}{p + ' latency':<12}{b:>10.3f} -> {n:>10.3f} ({n / b - 1:+.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flows", default=",".join(FLOWS))
+    parser.add_argument("--users", type=int, default=4, help="concurrent sessions per flow")
+    parser.add_argument("--requests", type=int, default=10, help="requests per session")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Groq time to first token, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--need-web-rate", type=float, default=0.2, help="share of chat answers that fall back to web search")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM calls that fail with a 429")
+    parser.add_argument("--search-latency", type=float, default=0.8, help="fake DuckDuckGo latency, seconds")
+    parser.add_argument("--speculative-search", action="store_true")
+    parser.add_argument("--meal-batch", action="store_true", help="analyze each meal in a single request")
+    parser.add_argument("--documents", type=int, default=3, help="bundled PDFs to ingest for Document Chat")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashing embeddings instead of the MiniLM model")
+    parser.add_argument("--rpm", type=int, default=100_000, help="LLM client requests/minute limit")
+    parser.add_argument("--tpm", type=int, default=100_000_000, help="LLM client tokens/minute limit")
+    parser.add_argument("--output", help="results file (default: benchmark_results/e2e-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_flow(args.child, args)))
+        sys.exit(0)
+
+    # Children read the LLM client limits at import time
+    env = dict(os.environ, THYBOT_LLM_REQUESTS_PER_MINUTE=str(args.rpm), THYBOT_LLM_TOKENS_PER_MINUTE=str(args.tpm))
+    commit = git_commit()
+    results = {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(args), "flows": {}}
+    for name in args.flows.split(","):
+        # A fresh process per flow, so peak RSS and caches belong to that flow alone
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--child", name],
+                               cwd=ROOT, env=env, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(f"{name}: failed\n{child.stderr[-2000:]}")
+            results["flows"][name] = {"failed": child.stderr[-2000:]}
+            continue
+        flow = results["flows"][name] = json.loads(child.stdout.strip().splitlines()[-1])
+        latency = flow["latency_s"]
+        print(f"{name:<10}{flow['requests']:>5} req {flow['errors']:>3} err {flow['throughput_rps']:>8.2f} req/s | "
+              f"p50 {latency.get('p50', 0):.3f}s p95 {latency.get('p95', 0):.3f}s | peak RSS {flow['peak_rss_mb']:.0f} MB")
+        if "ingest" in flow:
+            ingest = flow["ingest"]
+            print(f"{'':<10}ingest: {ingest['documents']} docs, {ingest['pages']} pages, {ingest['chunks']} chunks "
+                  f"in {ingest['seconds']:.1f}s ({ingest['pages_per_s']:.1f} pages/s)")
+
+    output = args.output or os.path.join(ROOT, "benchmark_results", f"e2e-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
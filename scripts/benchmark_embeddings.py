@@ -0,0 +1,64 @@
+"""Parity and throughput of the embedding backends (torch vs ONNX Runtime fp32 / int8).
+
+Embeds chunks of the bundled PDFs with each backend, reports chunks per second and the
+cosine similarity of every ONNX vector to its torch counterpart. Exits non-zero if any
+backend's minimum cosine falls below --min-cosine, so it doubles as a parity check.
+
+Run from the repo root:  python scripts/benchmark_embeddings.py [--chunks 512] [--threads 4]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def sample_chunks(n, chunk_size=1000, overlap=200):
+    from pypdf import PdfReader
+    chunks = []
+    for path in sorted(glob.glob("data/*.pdf")):
+        text = " ".join((page.extract_text() or "") for page in PdfReader(path).pages)
+        text = " ".join(text.split())
+        chunks.extend(text[i:i + chunk_size] for i in range(0, len(text), chunk_size - overlap))
+        if len(chunks) >= n:
+            break
+    return chunks[:n]
+
+
+def run(model, texts):
+    model.embed_documents(texts[:8])  # Warm up (graph optimisation, allocator)
+    t = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    return vectors, len(texts) / (time.perf_counter() - t)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    from utils import rag_utils
+    rag_utils.EMBEDDING_BATCH_SIZE = args.batch_size
+    rag_utils.EMBEDDING_THREADS = args.threads
+
+    texts = sample_chunks(args.chunks)
+    print(f"{len(texts)} chunks from data/*.pdf, batch size {args.batch_size}, threads {args.threads or 'default'}")
+
+    reference, rate = run(rag_utils.get_embedding_model("torch"), texts)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    print(f"{'torch':<12}{rate:>10.1f} chunks/s")
+
+    ok = True
+    for label, quantize in [("onnx", False), ("onnx-int8", True)]:
+        vectors, rate = run(rag_utils.get_embedding_model("onnx", quantize), texts)
+        cosine = np.sum(vectors * reference, axis=1)
+        ok &= cosine.min() >= args.min_cosine
+        print(f"{label:<12}{rate:>10.1f} chunks/s | cosine vs torch: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    sys.exit(0 if ok else 1)
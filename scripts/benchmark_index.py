@@ -0,0 +1,94 @@
+"""Recall vs latency vs memory for the FAISS index types in utils/rag_utils.
+
+Uses the knowledge-base vectors from scripts/build_kb_index.py (data/kb_vectors.npy).
+Pass --synthetic N to test at corpus sizes we don't have yet, e.g. --synthetic 200000.
+Pick an operating point, then deploy it with THYBOT_INDEX_TYPE / THYBOT_INDEX_PARAMS.
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.kb_index import VECTORS_PATH
+from utils.rag_utils import make_faiss_index, resolve_index_params
+
+CONFIGS = [
+    ("flat", {}),
+    ("hnsw", {"M": 16, "ef_search": 16}),
+    ("hnsw", {"M": 32, "ef_search": 32}),
+    ("hnsw", {"M": 32, "ef_search": 128}),
+    ("ivfpq", {"m": 16, "nprobe": 4}),
+    ("ivfpq", {"m": 16, "nprobe": 16}),
+    ("ivfpq", {"m": 48, "nprobe": 16}),
+    ("ivfpq", {"m": 48, "nprobe": 64}),
+]
+
+
+def synthetic_vectors(n, dim=384, clusters=256, seed=0):
+    # Clustered like real chunk embeddings, which matters for IVF recall
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    x = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+
+def make_queries(vectors, n_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    q = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    q = q + 0.05 * rng.normal(size=q.shape).astype("float32")
+    faiss.normalize_L2(q)
+    return q
+
+
+def benchmark(vectors, queries, truth, kind, params, k):
+    config = resolve_index_params(kind, len(vectors), params)
+    t = time.perf_counter()
+    index = make_faiss_index(vectors.shape[1], config, metric="ip", train_vectors=vectors)
+    index.add(vectors)
+    build_s = time.perf_counter() - t
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, q in enumerate(queries):
+        t = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - t)
+        found[i] = ids[0]
+    recall = np.mean([len(set(f) & set(tr)) / k for f, tr in zip(found, truth)])
+    size_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+    lat = np.array(latencies) * 1000
+    return config, recall, np.percentile(lat, 50), np.percentile(lat, 95), size_mb, build_s
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, help="Benchmark N synthetic vectors instead of the KB vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic)
+    elif os.path.exists(VECTORS_PATH):
+        vectors = np.load(VECTORS_PATH).astype("float32")
+    else:
+        sys.exit(f"{VECTORS_PATH} not found: run scripts/build_kb_index.py first, or pass --synthetic N")
+
+    queries = make_queries(vectors, args.queries)
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{len(vectors):,} vectors x {vectors.shape[1]} dims, {len(queries)} queries, recall@{args.k}")
+    print(f"{'index':<48}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}{'size MB':>10}{'build s':>9}")
+    for kind, params in CONFIGS:
+        config, recall, p50, p95, size_mb, build_s = benchmark(vectors, queries, truth, kind, params, args.k)
+        label = ", ".join(f"{k}={v}" for k, v in config.items() if k != "type")
+        label = f"{config['type']}({label})"
+        print(f"{label:<48}{recall:>8.3f}{p50:>9.3f}{p95:>9.3f}{size_mb:>10.2f}{build_s:>9.2f}")
@@ -0,0 +1,39 @@
+"""Rows per second for the scalar detect_thyroid_type loop vs the vectorized classify_panels.
+
+Run from the repo root:  python scripts/benchmark_lab_classifier.py [rows ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.lab_classifier import classify_panels, detect_thyroid_type
+
+
+def synthetic_panels(n, seed=0):
+    rng = np.random.default_rng(seed)
+    tsh = rng.lognormal(mean=0.6, sigma=0.9, size=n)
+    t3 = rng.normal(3.2, 0.8, size=n)
+    t4 = rng.normal(1.3, 0.4, size=n)
+    return tsh, t3, t4
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in sizes:
+        tsh, t3, t4 = synthetic_panels(n)
+
+        t = time.perf_counter()
+        scalar = [detect_thyroid_type(a, b, c) for a, b, c in zip(tsh.tolist(), t3.tolist(), t4.tolist())]
+        t_scalar = time.perf_counter() - t
+
+        t = time.perf_counter()
+        vector = classify_panels(tsh, t3, t4)
+        t_vector = time.perf_counter() - t
+
+        assert (np.asarray(scalar) == vector).all(), "vectorized classifier disagrees with scalar path"
+        print(f"{n:>10,} panels | scalar {n / t_scalar:>12,.0f} rows/s | vectorized {n / t_vector:>14,.0f} rows/s "
+              f"| {t_scalar / t_vector:>5.0f}x")
@@ -0,0 +1,68 @@
+"""Reports import time and peak RSS for each ThyBot page, each measured in a fresh process.
+
+Run from the repo root:  python scripts/benchmark_startup.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each page loads on its first render, minus network calls. Mirrors the page functions
+# in app.py: the chat pages build the service, a session and the shared LLM client (for the
+# sidebar metrics); Meal Analysis loads the food catalog. The Bulk Lab Triage page only shows
+# an uploader until a CSV arrives, so its entry also reads and classifies a small CSV.
+SERVICE_SESSION = (
+    "service = app.get_service()\n"
+    "service.session(service.create_session())\n"
+    "app.get_llm_client()\n"
+)
+PAGE_WARMUP = {
+    "Home": "",
+    "Patient Profile": "",
+    "General Chat": SERVICE_SESSION,
+    "Document Chat": SERVICE_SESSION + "service.embedding_cache.stats()\n",
+    "Meal Analysis": "app.get_service().catalog\n",
+    "Bulk Lab Triage": (
+        "import io\n"
+        "import pandas as pd\n"
+        "sample = io.StringIO('TSH,T3,T4\\n' + '2.1,3.0,1.2\\n' * 1000)\n"
+        "pd.read_csv(sample, nrows=0)\n"
+        "sample.seek(0)\n"
+        "for chunk in app.classify_csv_chunks(sample, chunksize=50_000, columns=('TSH', 'T3', 'T4')): pass\n"
+    ),
+}
+
+PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter() - t0
+{warmup}
+t_total = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"import_s": t_import, "total_s": t_total, "peak_rss_mb": rss_kb / 1024}}))
+"""
+
+
+def measure(page):
+    code = PROBE.format(warmup=PAGE_WARMUP[page])
+    # The LLM client is only constructed here, never called, so any key will do
+    env = dict(os.environ, GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "benchmark"))
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    results = {page: measure(page) for page in PAGE_WARMUP}
+    print(f"{'Page':<16}{'import app (s)':>16}{'first render (s)':>18}{'peak RSS (MB)':>16}")
+    for page, r in results.items():
+        if "error" in r:
+            print(f"{page:<16}  error: {r['error']}")
+        else:
+            print(f"{page:<16}{r['import_s']:>16.2f}{r['total_s']:>18.2f}{r['peak_rss_mb']:>16.0f}")
+    if "--json" in sys.argv:
+        print(json.dumps(results, indent=2))
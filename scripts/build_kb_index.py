@@ -0,0 +1,11 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.kb_index import build_kb_index
+
+result = build_kb_index()
+print(f"Re-embedded: {', '.join(result['embedded']) or 'none'}")
+print(f"Reused: {len(result['reused'])} unchanged PDF(s)")
+print(f"Knowledge base index built with {result['chunks']} chunks!")
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.lab_classifier import DEFAULT_REFERENCE_RANGES, classify_csv_chunks, load_reference_ranges
+
+parser = argparse.ArgumentParser(description="Classify thyroid status for a CSV of TSH/T3/T4 lab panels.")
+parser.add_argument("input", help="CSV of lab panels, or - for stdin")
+parser.add_argument("--output", default="-", help="Output CSV, or - for stdout (default)")
+parser.add_argument("--columns", nargs=3, default=["TSH", "T3", "T4"], metavar=("TSH", "T3", "T4"),
+                    help="Column names holding TSH, Free T3 and Free T4")
+parser.add_argument("--ranges", help='JSON reference ranges: {"default": {...}, "<lab>": {"tsh": [lo, hi], ...}}')
+parser.add_argument("--lab-column", help="Column naming the lab, to apply per-lab ranges from --ranges")
+parser.add_argument("--chunksize", type=int, default=100_000)
+args = parser.parse_args()
+
+ranges, lab_ranges = DEFAULT_REFERENCE_RANGES, None
+if args.ranges:
+    ranges, lab_ranges = load_reference_ranges(args.ranges)
+
+source = sys.stdin if args.input == "-" else args.input
+out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+rows = 0
+try:
+    chunks = classify_csv_chunks(source, chunksize=args.chunksize, columns=tuple(args.columns),
+                                 lab_column=args.lab_column, lab_ranges=lab_ranges, ranges=ranges)
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(out, header=i == 0, index=False)
+        rows += len(chunk)
+finally:
+    if out is not sys.stdout:
+        out.close()
+print(f"Classified {rows} lab panels.", file=sys.stderr)
@@ -0,0 +1,167 @@
+"""Load test for the HTTP API (service/api.py): many concurrent chat sessions against one process.
+
+By default it starts the API in this process on a free port, with the offline Groq and
+DuckDuckGo fakes from scripts/offline_fakes.py. Each session creates itself, then streams
+--requests chat turns (or meal analyses with --flow meal) back to back. For each concurrency
+level it reports requests/s, time to first token and end-to-end latency percentiles. Latency
+that stays flat as sessions grow means the process is scaling. Use --url to load an API that
+is already running somewhere else instead.
+
+Run from the repo root:  python scripts/load_test_api.py [--sessions 1,16,64,256] [--requests 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import ssl
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUESTIONS = [
+    "What does a high TSH level mean?",
+    "Can hypothyroidism cause weight gain?",
+    "Which foods should I avoid with Hashimoto's?",
+    "How long does levothyroxine take to work?",
+]
+MEALS = ["2 rotis, dal and paneer", "cabbage sabzi and rice", "poha with a glass of milk"]
+
+
+def start_local_server(args):
+    """Serves service.api:app on a thread in this process, with the offline fakes installed."""
+    import uvicorn
+    from offline_fakes import FakeGroq, install
+
+    install(FakeGroq(latency=args.llm_latency, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+                     need_web_rate=args.need_web_rate),
+            search_latency=args.search_latency, fake_embeddings=True)
+    from service.api import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def stream_events(client, url, body):
+    """Posts body and reads the NDJSON stream; returns (time to first token or None, event count)."""
+    start, first_token, count = time.perf_counter(), None, 0
+    async with client.stream("POST", url, json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            count += 1
+            if first_token is None and event["event"] in ("token", "answer", "item"):
+                first_token = time.perf_counter() - start
+    return first_token, count
+
+
+async def run_session(base, args, n, latencies, first_tokens, errors, ssl_context):
+    import httpx
+
+    # One client (and connection) per session, like real users; a shared httpx pool scans
+    # every connection per request and becomes the bottleneck itself at a few hundred sessions
+    async with httpx.AsyncClient(timeout=args.timeout, verify=ssl_context) as client:
+        await run_requests(client, base, args, n, latencies, first_tokens, errors)
+
+
+async def run_requests(client, base, args, n, latencies, first_tokens, errors):
+    try:
+        session_id = (await client.post(f"{base}/sessions")).json()["session_id"]
+    except Exception as e:
+        errors.append(repr(e))
+        return
+    for i in range(args.requests):
+        if args.flow == "chat":
+            url = f"{base}/sessions/{session_id}/chat"
+            body = {"message": QUESTIONS[(n + i) % len(QUESTIONS)], "thyroid_type": "Hypothyroidism", "response_style": "Concise"}
+        else:
+            url = f"{base}/meal"
+            body = {"description": MEALS[(n + i) % len(MEALS)], "thyroid_type": f"Hypothyroidism #{n}"}  # Not a memoized type, so each request reaches the LLM
+        start = time.perf_counter()
+        try:
+            first_token, _ = await stream_events(client, url, body)
+        except Exception as e:
+            errors.append(repr(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+        if first_token is not None:
+            first_tokens.append(first_token)
+    try:
+        await client.delete(f"{base}/sessions/{session_id}")
+    except Exception as e:
+        errors.append(repr(e))
+
+
+async def run_level(base, args, sessions):
+    latencies, first_tokens, errors = [], [], []
+    ssl_context = ssl.create_default_context()  # Building one per client costs more than a request
+    start, cpu_start = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(run_session(base, args, n, latencies, first_tokens, errors, ssl_context) for n in range(sessions)))
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+    def pct(values, p):
+        return float(np.percentile(values, p)) if values else 0.0
+    return {
+        "sessions": sessions,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall,
+        "latency_p50_s": pct(latencies, 50),
+        "latency_p95_s": pct(latencies, 95),
+        "first_token_p50_s": pct(first_tokens, 50),
+        "first_token_p95_s": pct(first_tokens, 95),
+        "cpu_util": cpu / wall,  # Includes this client when the server runs in-process
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load this running API instead of starting one with the offline fakes")
+    parser.add_argument("--flow", choices=["chat", "meal"], default="chat")
+    parser.add_argument("--sessions", default="1,16,64,256", help="concurrency levels to run, comma-separated")
+    parser.add_argument("--requests", type=int, default=5, help="requests per session")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Groq time to first token, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--need-web-rate", type=float, default=0.1)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        # The fake backend has no quota; lift the client limits so the service itself is measured
+        os.environ.setdefault("THYBOT_LLM_MAX_CONCURRENCY", "100000")
+        os.environ.setdefault("THYBOT_LLM_REQUESTS_PER_MINUTE", "100000000")
+        os.environ.setdefault("THYBOT_LLM_TOKENS_PER_MINUTE", "100000000000")
+        base = start_local_server(args)
+
+    results = []
+    for sessions in (int(n) for n in args.sessions.split(",")):
+        level = asyncio.run(run_level(base, args, sessions))
+        results.append(level)
+        print(f"{sessions:>5} sessions {level['requests']:>6} req {level['errors']:>4} err {level['throughput_rps']:>8.1f} req/s | "
+              f"first token p50 {level['first_token_p50_s']:.3f}s p95 {level['first_token_p95_s']:.3f}s | "
+              f"latency p50 {level['latency_p50_s']:.3f}s p95 {level['latency_p95_s']:.3f}s | CPU {level['cpu_util']:.0%} | peak RSS {level['peak_rss_mb']:.0f} MB")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "levels": results}, f, indent=2)
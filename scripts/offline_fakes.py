@@ -0,0 +1,138 @@
+"""Offline stand-ins for Groq, DuckDuckGo and (optionally) the embedding model.
+
+install() swaps them in for the current process, so app code runs unchanged without
+API keys or network access. Latencies are simulated with sleeps; they release the GIL
+like real network waits do.
+"""
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+FILLER = ("Thyroid hormone levels should be interpreted alongside symptoms and a clinician's advice. "
+          "Iodine intake, selenium and regular follow-up tests all matter for long-term management.").split()
+
+
+class FakeStatusError(Exception):
+    """Looks like groq.APIStatusError to the retry logic."""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"Error code: {status_code} (simulated)")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeGroq:
+    """Mimics groq.Groq().chat.completions.create, streaming or not.
+
+    latency is the time to the first token; tokens_per_second paces the rest. need_web_rate
+    is the share of general-chat answers that come back as the [[NEED_WEB]] sentinel, and
+    error_rate the share of calls that fail with a 429.
+    """
+
+    def __init__(self, latency=0.3, tokens_per_second=200, reply_tokens=120, need_web_rate=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.need_web_rate = need_web_rate
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random(), self._random.random()
+
+    def _reply(self, messages, wants_web):
+        prompt = messages[-1]["content"]
+        if "JSON object mapping each item" in prompt:
+            items = re.findall(r"^- (.+?) \| Thyroid impact:", prompt, flags=re.MULTILINE)
+            per_item = max(1, self.reply_tokens // max(1, len(items)))
+            return json.dumps({item: " ".join(FILLER[i % len(FILLER)] for i in range(per_item)) for item in items})
+        if wants_web and "[[NEED_WEB]]" in messages[0]["content"]:
+            return "[[NEED_WEB]]"
+        return " ".join(FILLER[i % len(FILLER)] for i in range(self.reply_tokens))
+
+    def create(self, model, messages, stream=False, **kwargs):
+        fail, web = self._draw()
+        if fail < self.error_rate:
+            time.sleep(self.latency / 4)
+            raise FakeStatusError(429, retry_after=0.05)
+        reply = self._reply(messages, web < self.need_web_rate)
+        tokens = re.findall(r"\S+\s*", reply)
+        if not stream:
+            time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+        return self._stream(tokens)
+
+    def _stream(self, tokens):
+        time.sleep(self.latency)
+        for token in tokens:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+            time.sleep(1 / self.tokens_per_second)
+
+
+class FakeDDGS:
+    """Mimics duckduckgo_search.DDGS as a context manager with text()."""
+
+    latency = 0.8
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def text(self, query, max_results=5):
+        time.sleep(self.latency)
+        return [{"title": f"Result {i + 1} for {query}", "body": " ".join(FILLER[i:i + 20]), "href": f"https://example.org/{i}"}
+                for i in range(max_results)]
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors, for machines without the sentence-transformers model."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") % self.dim] += 1
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def install(llm, search_latency=0.8, fake_embeddings=False):
+    """Routes this process's Groq and DuckDuckGo calls (and optionally embeddings) to the fakes."""
+    import models.llm
+    models.llm.get_groq_client = lambda: llm
+
+    FakeDDGS.latency = search_latency
+    module = types.ModuleType("duckduckgo_search")
+    module.DDGS = FakeDDGS
+    sys.modules["duckduckgo_search"] = module
+
+    if fake_embeddings:
+        import utils.kb_index
+        import utils.rag_utils
+        embeddings = HashingEmbeddings()
+        utils.rag_utils.get_embedding_model = utils.kb_index.get_embedding_model = lambda *args, **kwargs: embeddings
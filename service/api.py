@@ -0,0 +1,228 @@
+"""HTTP API over ThyBotService.
+
+Run with:  uvicorn service.api:app --host 0.0.0.0 --port 8000
+
+Sessions live in process memory, so run one worker per process behind a sticky load balancer.
+Endpoints that stream take "stream": true (the default) and answer with newline-delimited JSON
+events; with "stream": false they answer with one JSON object once the flow has finished.
+
+    POST   /profile/classify                        {"tsh", "t3", "t4"} -> {"thyroid_type"}
+    POST   /sessions                                -> {"session_id"}
+    DELETE /sessions/{sid}
+    PUT    /sessions/{sid}/profile                  {"tsh", "t3", "t4", ...} -> profile with thyroid_type
+    GET    /sessions/{sid}/chat                     -> {"messages"}
+    DELETE /sessions/{sid}/chat
+    POST   /sessions/{sid}/chat                     {"message", "response_style"?, "thyroid_type"?, "speculative_search"?, "stream"?}
+    POST   /sessions/{sid}/documents?file_name=...  raw file bytes -> document status
+    GET    /sessions/{sid}/documents/{doc_id}       -> document status
+    DELETE /sessions/{sid}/documents/{doc_id}
+    POST   /sessions/{sid}/documents/{doc_id}/ask   {"question", "response_style"?, "thyroid_type"?, "stream"?}
+    POST   /meal                                    {"items": [...] | "description", "thyroid_type", "quantities"?, "batch"?, "stream"?}
+                                                    (a description adds a leading "parsed" event with match candidates)
+    GET    /metrics                                 Prometheus text: stage timings and LLM client counters
+    GET    /healthz
+"""
+import json
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from service.core import DocumentNotFoundError, SessionNotFoundError, ThyBotService
+from utils.perf import export_prometheus
+
+service = ThyBotService()
+
+
+async def json_body(request):
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    return body
+
+
+def field(body, name):
+    if name not in body:
+        raise ValueError(f"Missing field: {name}")
+    return body[name]
+
+
+def text_field(body, name):
+    value = field(body, name)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{name} must be a non-empty string")
+    return value
+
+
+def number_field(body, name):
+    value = field(body, name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} must be a number")
+    return value
+
+
+async def ndjson(events):
+    async for event in events:
+        yield json.dumps(event) + "\n"
+
+
+async def collect(events):
+    """Folds an event stream into one response body."""
+    body = {"errors": []}
+    async for event in events:
+        kind = event.pop("event")
+        if kind == "token":
+            body["reply"] = body.get("reply", "") + event["text"]
+        elif kind == "answer":
+            body["web_answer"], body["sources"] = event["text"], event["sources"]
+        elif kind == "item":
+            body.setdefault("items", []).append(event)
+        elif kind == "totals":
+            body["totals"] = event["totals"]
+        elif kind == "parsed":
+            body["parsed"] = event["items"]
+        elif kind == "error":
+            body["errors"].append(event["message"])
+    return body
+
+
+async def respond(events, stream):
+    if stream:
+        return StreamingResponse(ndjson(events), media_type="application/x-ndjson")
+    return JSONResponse(await collect(events))
+
+
+async def classify_profile(request):
+    body = await json_body(request)
+    return JSONResponse({"thyroid_type": service.classify_profile(*(number_field(body, name) for name in ("tsh", "t3", "t4")))})
+
+
+async def create_session(request):
+    return JSONResponse({"session_id": service.create_session()}, status_code=201)
+
+
+async def end_session(request):
+    service.end_session(request.path_params["sid"])
+    return Response(status_code=204)
+
+
+async def set_profile(request):
+    body = await json_body(request)
+    for name in ("tsh", "t3", "t4"):
+        number_field(body, name)
+    return JSONResponse(service.set_profile(request.path_params["sid"], body))
+
+
+async def chat_history(request):
+    return JSONResponse({"messages": service.session(request.path_params["sid"]).general_messages})
+
+
+async def clear_chat(request):
+    service.clear_chat(request.path_params["sid"])
+    return Response(status_code=204)
+
+
+async def chat(request):
+    body = await json_body(request)
+    service.session(request.path_params["sid"])  # Unknown sessions fail here, before streaming starts
+    events = service.chat(
+        request.path_params["sid"], text_field(body, "message"), thyroid_type=body.get("thyroid_type"),
+        response_style=body.get("response_style", "Detailed"), speculative_search=body.get("speculative_search", False),
+    )
+    return await respond(events, body.get("stream", True))
+
+
+async def upload_document(request):
+    file_name = request.query_params.get("file_name")
+    if not file_name:
+        raise ValueError("file_name query parameter is required")
+    status = await service.upload_document(request.path_params["sid"], file_name, await request.body())
+    return JSONResponse(status, status_code=202)
+
+
+async def document_status(request):
+    return JSONResponse(service.document_status(request.path_params["sid"], request.path_params["doc_id"]))
+
+
+async def end_document(request):
+    service.end_document(request.path_params["sid"], request.path_params["doc_id"])
+    return Response(status_code=204)
+
+
+async def ask_document(request):
+    body = await json_body(request)
+    service.document_status(request.path_params["sid"], request.path_params["doc_id"])
+    events = service.ask_document(
+        request.path_params["sid"], request.path_params["doc_id"], text_field(body, "question"),
+        thyroid_type=body.get("thyroid_type"), response_style=body.get("response_style", "Detailed"),
+    )
+    return await respond(events, body.get("stream", True))
+
+
+async def analyze_meal(request):
+    body = await json_body(request)
+    quantities = body.get("quantities", {})
+    if not isinstance(quantities, dict) or not all(isinstance(q, (int, float)) for q in quantities.values()):
+        raise ValueError("quantities must map dish names to numbers")
+    parsed = None
+    if "description" in body:
+        parsed = [{"item": dish, "quantity": quantity, "candidates": candidates}
+                  for dish, quantity, candidates in service.parse_meal(text_field(body, "description"))]
+        items = list(dict.fromkeys(p["item"] for p in parsed))
+        quantities = {**{p["item"]: p["quantity"] for p in parsed}, **quantities}
+    else:
+        items = field(body, "items")
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            raise ValueError("items must be a list of dish names")
+    events = service.analyze_meal(items, field(body, "thyroid_type"), quantities=quantities, batch=body.get("batch", False))
+    if parsed is not None:
+        events = with_parsed(parsed, events)
+    return await respond(events, body.get("stream", True))
+
+
+async def with_parsed(parsed, events):
+    # Tells the client how the description was read; ambiguous parts carry their candidates
+    yield {"event": "parsed", "items": parsed}
+    async for event in events:
+        yield event
+
+
+async def metrics(request):
+    from models.llm import get_llm_client
+    lines = [export_prometheus()]
+    for name, value in get_llm_client().metrics.snapshot().items():
+        lines.append(f"thybot_llm_{name} {value}\n")
+    return PlainTextResponse("".join(lines), media_type="text/plain; version=0.0.4")
+
+
+async def healthz(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def not_found(request, exc):
+    return JSONResponse({"error": str(exc)}, status_code=404)
+
+
+async def bad_request(request, exc):
+    return JSONResponse({"error": str(exc)}, status_code=400)
+
+
+app = Starlette(
+    routes=[
+        Route("/profile/classify", classify_profile, methods=["POST"]),
+        Route("/sessions", create_session, methods=["POST"]),
+        Route("/sessions/{sid}", end_session, methods=["DELETE"]),
+        Route("/sessions/{sid}/profile", set_profile, methods=["PUT"]),
+        Route("/sessions/{sid}/chat", chat_history, methods=["GET"]),
+        Route("/sessions/{sid}/chat", clear_chat, methods=["DELETE"]),
+        Route("/sessions/{sid}/chat", chat, methods=["POST"]),
+        Route("/sessions/{sid}/documents", upload_document, methods=["POST"]),
+        Route("/sessions/{sid}/documents/{doc_id}", document_status, methods=["GET"]),
+        Route("/sessions/{sid}/documents/{doc_id}", end_document, methods=["DELETE"]),
+        Route("/sessions/{sid}/documents/{doc_id}/ask", ask_document, methods=["POST"]),
+        Route("/meal", analyze_meal, methods=["POST"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/healthz", healthz, methods=["GET"]),
+    ],
+    exception_handlers={SessionNotFoundError: not_found, DocumentNotFoundError: not_found, ValueError: bad_request},
+)
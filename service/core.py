@@ -0,0 +1,404 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from service.flows import (
+    DOCUMENT_TYPES, MEAL_ANALYSIS_WORKERS, analyze_meal_batched, document_chat_messages, general_chat_messages,
+    meal_item_prompt, meal_rows, needs_web_search, refresh_chat_summary, split_need_web, start_document_ingest,
+    summarize_search_for_thyroid,
+)
+from utils.context_budget import messages_tokens, new_summary_state
+from utils.lab_classifier import BORDERLINE, HYPER, HYPO, NORMAL, detect_thyroid_type
+from utils.perf import ensure_trace, in_current_context, span
+from utils.web_search import perform_web_search, start_web_search
+
+# Threads for blocking work (LLM and search calls, embedding, FAISS). A streaming reply holds
+# one while it streams, so this also caps concurrent streams; blocked threads cost little.
+SERVICE_THREADS = int(os.environ.get("THYBOT_SERVICE_THREADS", "512"))
+SESSION_TTL = int(os.environ.get("THYBOT_SESSION_TTL", str(60 * 60)))  # seconds idle
+MAX_SESSIONS = int(os.environ.get("THYBOT_MAX_SESSIONS", "10000"))
+MEAL_MEMO_MAX_ENTRIES = int(os.environ.get("THYBOT_MEAL_MEMO_MAX_ENTRIES", "4096"))
+# Only analyses for these are memoized; API clients can send any thyroid_type string
+MEMO_THYROID_TYPES = (HYPO, HYPER, NORMAL, BORDERLINE)
+
+
+class SessionNotFoundError(LookupError):
+    """Raised for session ids the service doesn't know, e.g. after the session expired."""
+
+
+class DocumentNotFoundError(LookupError):
+    """Raised for document ids not uploaded to (or already removed from) a session."""
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class Session:
+    """Per-user conversation state, kept by the service instead of in st.session_state."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.profile = {}
+        self.general_messages = []
+        self.general_summary = new_summary_state()
+        # Future of the background call folding old turns into general_summary; not tied to an event loop
+        self.summary_refresh = None
+        self.documents = {}  # document id -> IngestJob
+        self.document_messages = {}  # document id -> [messages]
+        self.last_prompt_tokens = None
+        self.touched = time.monotonic()
+
+    @property
+    def thyroid_type(self):
+        return self.profile.get("thyroid_type", "Not specified")
+
+    def record_prompt_tokens(self, baseline_messages, messages_for_llm):
+        self.last_prompt_tokens = {
+            "sent": messages_tokens(messages_for_llm),
+            "baseline": messages_tokens(baseline_messages),
+        }
+
+
+def document_status(doc_id, job):
+    return {
+        "document_id": doc_id,
+        "file_name": job.file_name,
+        "pages_done": job.pages_done,
+        "total_pages": job.total_pages,
+        "chunks_done": job.chunks_done,
+        "progress": 1.0 if job.done else job.progress,
+        "ready": job.index is not None,
+        "done": job.done,
+        "error": str(job.error) if job.error else None,
+    }
+
+
+class ThyBotService:
+    """The app's flows as an asyncio API: profile classification, general chat with web
+    fallback, document upload and QA, and meal analysis.
+
+    Streaming methods are async generators of event dicts ({"event": "token", "text": ...},
+    "status", "answer", "item", "totals", "error", and a final "done"). Blocking work runs on
+    a thread pool, so one event loop can serve many sessions at once.
+    """
+
+    def __init__(self, chat_model=None, kb=None, catalog=None, embedding_cache=None, threads=SERVICE_THREADS):
+        self._chat_model = chat_model
+        self._kb = kb
+        self._catalog = catalog
+        self._embedding_cache = embedding_cache
+        self._resource_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="thybot-service")
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        # (thyroid_type, catalog dish) -> analysis, shared across sessions; least recently used first
+        self.meal_memo = OrderedDict()
+        self._meal_memo_lock = threading.Lock()
+
+    # ------------------ RESOURCES ------------------
+    # Created on first use, so a service that only classifies profiles never loads them
+
+    def _resource(self, name, create):
+        with self._resource_lock:
+            if getattr(self, name) is None:
+                setattr(self, name, create())
+            return getattr(self, name)
+
+    @property
+    def chat_model(self):
+        from models.llm import get_groq_model
+        return self._resource("_chat_model", get_groq_model)
+
+    @property
+    def kb(self):
+        from utils.kb_index import load_kb_index
+        # False marks "looked, not built", so the disk isn't checked on every request
+        return self._resource("_kb", lambda: load_kb_index() or False) or None
+
+    @property
+    def catalog(self):
+        from utils.food_catalog import FoodCatalog
+        return self._resource("_catalog", FoodCatalog.from_csv)
+
+    @property
+    def embedding_cache(self):
+        from utils.embedding_cache import EmbeddingCache
+        return self._resource("_embedding_cache", EmbeddingCache)
+
+    async def _run(self, fn, *args):
+        # Spans recorded by fn are attributed to the caller's trace
+        return await asyncio.get_running_loop().run_in_executor(self._executor, in_current_context(fn), *args)
+
+    async def _iterate(self, iterable):
+        """Drains a blocking iterator (e.g. an LLM stream) on the thread pool and yields lists of items.
+
+        Items that arrive while the consumer is busy come out together, so a loaded server
+        sends fewer, larger chunks instead of falling behind one token at a time.
+        """
+        loop, queue, stop = asyncio.get_running_loop(), asyncio.Queue(), threading.Event()
+        end = object()
+
+        def pump():
+            try:
+                for item in iterable:
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+                    if stop.is_set():
+                        break
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, _Failed(e))
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()  # Releases the LLM slot if the client went away
+                loop.call_soon_threadsafe(queue.put_nowait, end)
+
+        pumping = loop.run_in_executor(self._executor, in_current_context(pump))
+        try:
+            while True:
+                batch = [await queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                finished = batch[-1] is end
+                items = batch[:-1] if finished else batch
+                if items and isinstance(items[-1], _Failed):
+                    raise items[-1].error
+                if items:
+                    yield items
+                if finished:
+                    return
+        finally:
+            stop.set()
+            await pumping
+
+    # ------------------ SESSIONS ------------------
+
+    def create_session(self):
+        session = Session()
+        with self._sessions_lock:
+            now = time.monotonic()
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if len(self._sessions) < MAX_SESSIONS and now - oldest.touched < SESSION_TTL:
+                    break
+                self._sessions.popitem(last=False)
+            self._sessions[session.id] = session
+        return session.id
+
+    def session(self, session_id):
+        """Raises SessionNotFoundError for unknown or expired sessions."""
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionNotFoundError(f"Unknown or expired session: {session_id}")
+            session.touched = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def end_session(self, session_id):
+        with self._sessions_lock:
+            self._sessions.pop(session_id, None)
+
+    def clear_chat(self, session_id):
+        session = self.session(session_id)
+        session.general_messages = []
+        session.general_summary = new_summary_state()
+
+    # ------------------ PROFILE ------------------
+
+    def classify_profile(self, tsh, t3, t4):
+        return detect_thyroid_type(float(tsh), float(t3), float(t4))
+
+    def set_profile(self, session_id, profile):
+        """Stores the profile on the session, with thyroid_type derived from its lab values."""
+        profile = dict(profile, thyroid_type=self.classify_profile(profile["tsh"], profile["t3"], profile["t4"]))
+        self.session(session_id).profile = profile
+        return profile
+
+    # ------------------ GENERAL CHAT ------------------
+
+    async def chat(self, session_id, message, thyroid_type=None, response_style="Detailed", speculative_search=False):
+        ensure_trace("General Chat")
+        session = self.session(session_id)
+        thyroid_type = thyroid_type or session.thyroid_type
+        if session.summary_refresh is not None:
+            # Usually finished while the user was typing; a failed refresh is retried after this reply
+            await asyncio.gather(asyncio.wrap_future(session.summary_refresh), return_exceptions=True)
+        user_turn = {"role": "user", "content": message}
+        messages_for_llm, baseline = await self._run(
+            general_chat_messages, message, [*session.general_messages, user_turn], session.general_summary,
+            thyroid_type, response_style, self.kb,
+        )
+        # Only recorded once the prompt has built, so a bad message can't wedge the history
+        session.general_messages.append(user_turn)
+        session.record_prompt_tokens(baseline, messages_for_llm)
+        # Speculatively start the web search alongside the LLM call
+        search_future = start_web_search(message, max_results=6) if speculative_search else None
+
+        reply, failed = "", False
+        try:
+            # Only the first few tokens are read here, to rule the [[NEED_WEB]] sentinel in or out
+            wants_web, token_stream = await self._run(split_need_web, self.chat_model.stream(messages_for_llm))
+            if not wants_web:
+                async for tokens in self._iterate(token_stream):
+                    reply += "".join(tokens)
+                    yield {"event": "token", "text": "".join(tokens)}
+        except Exception as e:
+            wants_web, failed = False, True
+            reply = f"⚠️ Error generating response: {e}"
+            yield {"event": "error", "message": reply}
+        if not wants_web:
+            session.general_messages.append({"role": "assistant", "content": reply})
+
+        if wants_web or (not failed and needs_web_search(reply)):
+            yield {"event": "status", "text": "Searching the web..."}
+            try:
+                with span("web.wait"):
+                    if search_future:
+                        results = await asyncio.wrap_future(search_future)
+                    else:
+                        results = await self._run(perform_web_search, message, 6)
+                summary = await self._run(summarize_search_for_thyroid, message, results)
+                session.general_messages.append({"role": "assistant", "content": summary})
+                yield {"event": "answer", "text": summary, "sources": results}
+            except Exception as e:
+                fallback_msg = f"⚠️ Web search failed: {e}"
+                session.general_messages.append({"role": "assistant", "content": fallback_msg})
+                yield {"event": "error", "message": fallback_msg}
+        elif search_future:
+            # The model was confident; an in-flight search still warms the cache
+            search_future.cancel()
+        # Any summary call happens after the reply, in the background
+        session.summary_refresh = self._executor.submit(
+            in_current_context(refresh_chat_summary), session.general_messages, session.general_summary, self.chat_model
+        )
+        yield {"event": "done"}
+
+    # ------------------ DOCUMENT CHAT ------------------
+
+    async def upload_document(self, session_id, file_name, file_bytes):
+        """Starts reading the document in the background and returns its status."""
+        if os.path.splitext(file_name)[1].lower() not in DOCUMENT_TYPES:
+            raise ValueError(f"Unsupported file type: {file_name} (expected {', '.join(DOCUMENT_TYPES)})")
+        session = self.session(session_id)
+        job = await self._run(start_document_ingest, file_name, file_bytes, self.embedding_cache)
+        doc_id = uuid.uuid4().hex[:12]
+        session.documents[doc_id] = job
+        session.document_messages[doc_id] = []
+        return document_status(doc_id, job)
+
+    def _document(self, session, doc_id):
+        job = session.documents.get(doc_id)
+        if job is None:
+            raise DocumentNotFoundError(f"Unknown document: {doc_id}")
+        return job
+
+    def document_status(self, session_id, doc_id):
+        return document_status(doc_id, self._document(self.session(session_id), doc_id))
+
+    def end_document(self, session_id, doc_id):
+        session = self.session(session_id)
+        session.documents.pop(doc_id, None)
+        session.document_messages.pop(doc_id, None)
+
+    async def ask_document(self, session_id, doc_id, question, thyroid_type=None, response_style="Detailed"):
+        ensure_trace("Document Chat")
+        session = self.session(session_id)
+        job = self._document(session, doc_id)
+        if job.index is None:
+            yield {"event": "error", "message": f"Still reading the first pages of {job.file_name}."}
+            yield {"event": "done"}
+            return
+        history = session.document_messages[doc_id]
+        docs = await self._run(job.search, question)
+        messages_for_llm, baseline = document_chat_messages(question, docs, thyroid_type or session.thyroid_type, response_style)
+        history.append({"role": "user", "content": question})
+        session.record_prompt_tokens(baseline, messages_for_llm)
+        reply = ""
+        try:
+            async for tokens in self._iterate(self.chat_model.stream(messages_for_llm)):
+                reply += "".join(tokens)
+                yield {"event": "token", "text": "".join(tokens)}
+        except Exception as e:
+            reply = f"⚠️ Error generating response: {e}"
+            yield {"event": "error", "message": reply}
+        history.append({"role": "assistant", "content": reply})
+        yield {"event": "done"}
+
+    # ------------------ MEAL ANALYSIS ------------------
+
+    def _memo_get(self, thyroid_type, item):
+        with self._meal_memo_lock:
+            analysis = self.meal_memo.get((thyroid_type, item))
+            if analysis is not None:
+                self.meal_memo.move_to_end((thyroid_type, item))
+            return analysis
+
+    def _memo_put(self, thyroid_type, item, analysis):
+        if thyroid_type not in MEMO_THYROID_TYPES or item not in self.catalog.row_by_name:
+            return
+        with self._meal_memo_lock:
+            self.meal_memo[(thyroid_type, item)] = analysis
+            self.meal_memo.move_to_end((thyroid_type, item))
+            while len(self.meal_memo) > MEAL_MEMO_MAX_ENTRIES:
+                self.meal_memo.popitem(last=False)
+
+    def parse_meal(self, description):
+        """Resolves free text to [(dish, quantity, candidates)].
+
+        Parts that match no dish, or several equally well, are kept by name; candidates then
+        lists the closest catalog dishes. A plain word read as its plain dish ("dal" -> "Mixed
+        dal") lists the other dishes it could be.
+        """
+        return [(dish or part, quantity, candidates) for part, quantity, dish, candidates in self.catalog.parse_meal(description)]
+
+    async def analyze_meal(self, items, thyroid_type, quantities=None, batch=False):
+        """Yields the meal's nutrient totals, then one "item" event per dish as its analysis arrives."""
+        ensure_trace("Meal Analysis")
+        catalog = self.catalog
+        quantities = quantities or {}
+        rows = meal_rows(catalog, items)
+        totals = catalog.meal_totals({item: quantities.get(item, 1) for item in items if item in catalog.row_by_name})
+        yield {"event": "totals", "totals": totals}
+
+        def item_event(item, analysis=None, error=None):
+            impact, nutrients = rows[item]
+            return {"event": "item", "item": item, "impact": impact, "nutrients": nutrients, "analysis": analysis, "error": error}
+
+        pending = []
+        for item in items:
+            analysis = self._memo_get(thyroid_type, item)
+            if analysis is not None:
+                yield item_event(item, analysis)
+            else:
+                pending.append(item)
+
+        if pending and batch:
+            try:
+                results = await self._run(analyze_meal_batched, self.chat_model, thyroid_type, {item: rows[item] for item in pending})
+            except Exception:
+                results = {}  # Fall back to per-item requests below
+            for item, reply in results.items():
+                self._memo_put(thyroid_type, item, reply)
+                yield item_event(item, reply)
+            pending = [item for item in pending if item not in results]
+
+        limit = asyncio.Semaphore(MEAL_ANALYSIS_WORKERS)
+
+        async def analyze(item):
+            async with limit:
+                try:
+                    response = await self._run(self.chat_model.invoke, meal_item_prompt(thyroid_type, item, *rows[item]))
+                    reply = response.content if hasattr(response, "content") else str(response)
+                    self._memo_put(thyroid_type, item, reply)
+                    return item_event(item, reply)
+                except Exception as e:
+                    return item_event(item, error=f"⚠️ Error analyzing {item}: {e}")
+
+        for next_done in asyncio.as_completed([analyze(item) for item in pending]):
+            yield await next_done
+        yield {"event": "done"}
@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+
+from utils.context_budget import PROMPT_TOKEN_BUDGET, build_history, fit_chunks, messages_tokens, refresh_summary
+from utils.embedding_cache import document_cache_key
+from utils.ingest import IngestJob
+from utils.kb_index import search_kb
+from utils.perf import span
+from utils.rag_utils import embedding_model_id
+from utils.thyroid_tagger import tag_thyroid_impact
+from utils.web_search import get_completion
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+DOCUMENT_TYPES = (".pdf", ".docx", ".txt")
+MEAL_ANALYSIS_WORKERS = 4
+
+# -------------- WEB-SEARCH ------------------------
+
+LOW_CONFIDENCE_FLAGS = [
+    "i don't know", "i am not sure", "not sure", "cannot find", "no information",
+    "i don’t have enough information", "insufficient", "can't answer", "cannot answer"
+]
+
+def needs_web_search(reply: str) -> bool:
+    if not reply:
+        return True
+    text = reply.strip().lower()
+    if text == "[[need_web]]":
+        return True
+    if len(text) < 40 and any(w in text for w in ["maybe", "unsure", "unclear", "unknown"]):
+        return True
+    if any(flag in text for flag in LOW_CONFIDENCE_FLAGS):
+        return True
+    return False
+
+def summarize_search_for_thyroid(query: str, results: list) -> str:
+    if not results:
+        return "I couldn’t find reliable sources right now. Try rephrasing or a different angle."
+    lines = []
+    for i, r in enumerate(results, 1):
+        title = r.get("title", "No title")
+        snippet = r.get("snippet", "No description available.")
+        link = r.get("link", "#")
+        lines.append(f"{i}. {title} — {snippet} ({link})")
+    prompt = (
+        "You are ThyBot, a thyroid-focused assistant. Using ONLY the snippets below, write a concise, reliable answer. "
+        "Highlight consensus, note contradictions if any, and give 2–3 practical tips. "
+        "Do not invent facts beyond these snippets.\n\n" + "\n".join(lines)
+    )
+    with span("web.summarize"):
+        return get_completion(prompt) or "No summary generated."
+
+
+NEED_WEB_SENTINEL = "[[need_web]]"
+
+def split_need_web(token_stream):
+    """Reads just enough of a token stream to tell whether the reply is the [[NEED_WEB]] sentinel.
+
+    Returns (True, None) if the model asked for a web search, otherwise (False, stream) where
+    stream yields the buffered head followed by the rest of the tokens.
+    """
+    token_stream = iter(token_stream)
+    head = ""
+    for token in token_stream:
+        head += token
+        text = head.strip().lower()
+        if text.startswith(NEED_WEB_SENTINEL):
+            return True, None
+        if text and not NEED_WEB_SENTINEL.startswith(text):
+            break
+    if not head.strip():
+        return True, None
+
+    def replay():
+        yield head
+        yield from token_stream
+    return False, replay()
+
+# -------------- CHAT ------------------------
+
+def general_chat_messages(prompt, messages, summary_state, thyroid_type, response_style, kb=None):
+    """Builds the budgeted prompt for a general chat turn; returns (messages for the LLM, unbudgeted baseline).
+
+    messages is the chat history ending with prompt; summary_state is updated in place.
+    kb is the bundled guideline index from load_kb_index, if it has been built.
+    """
+    # System message tells LLM to signal [[NEED_WEB]] if unsure
+    system_message = (
+        "You are ThyBot, an expert AI assistant for thyroid health. "
+        f"The user's thyroid status is '{thyroid_type}'. "
+        f"Your response style should be {response_style}. "
+        "If you are NOT reasonably certain based on your internal knowledge, reply EXACTLY with [[NEED_WEB]] and nothing else."
+    )
+
+    # Ground the answer in the bundled guideline PDFs, giving the excerpts at most half of the prompt budget
+    excerpts = []
+    if kb is not None:
+        excerpts = [f"[{c['source']}, p.{c['page']}] {c['text']}" for c in search_kb(prompt, kb, k=4)]
+    def with_reference(chunks):
+        if not chunks:
+            return system_message
+        return (system_message + " Use the following excerpts from thyroid guidelines where relevant.\n\n"
+                "REFERENCE:\n---\n" + "\n\n".join(chunks))
+
+    messages_for_llm = [{"role": "system", "content": with_reference(fit_chunks(excerpts, PROMPT_TOKEN_BUDGET // 2))}]
+    # History fills the rest; older turns live on in a rolling summary (see refresh_chat_summary)
+    with span("history.build"):
+        messages_for_llm += build_history(messages, PROMPT_TOKEN_BUDGET - messages_tokens(messages_for_llm), summary_state)
+    # What the unbudgeted prompt (all excerpts, last 8 turns verbatim) would have cost
+    baseline = [{"role": "system", "content": with_reference(excerpts)}] + messages[-8:]
+    return messages_for_llm, baseline
+
+def refresh_chat_summary(messages, summary_state, chat_model):
+    """Folds older turns into the summary if the history is near its budget; runs after the reply."""
+    def summarize(prompt):
+        with span("history.summarize"):
+            return chat_model.invoke(prompt)
+    return refresh_summary(messages, summary_state, summarize)
+
+def document_chat_messages(prompt, docs, thyroid_type, response_style):
+    """Fits the retrieved chunks into the prompt budget; returns (messages for the LLM, unbudgeted baseline)."""
+    instructions = (f"You are ThyBot, an expert AI assistant. Answer questions based ONLY on the provided document context. "
+                    f"The user's thyroid status is '{thyroid_type}'. Your response style should be {response_style}.\n\n"
+                    f"CONTEXT:\n---\n")
+    context_budget = PROMPT_TOKEN_BUDGET - messages_tokens([{"role": "system", "content": instructions}, {"role": "user", "content": prompt}])
+    context = "\n\n".join(fit_chunks([doc.page_content for doc in docs], context_budget))
+
+    messages_for_llm = [{"role": "system", "content": instructions + context}, {"role": "user", "content": prompt}]
+    baseline = [{"role": "system", "content": instructions + "\n\n".join(doc.page_content for doc in docs)}, {"role": "user", "content": prompt}]
+    return messages_for_llm, baseline
+
+def start_document_ingest(file_name, file_bytes, cache):
+    """Returns an IngestJob for the upload. Repeat uploads come straight from the embedding cache;
+    new ones are read, split and embedded in the background, batch by batch."""
+    key = document_cache_key(file_bytes, CHUNK_SIZE, CHUNK_OVERLAP, model_name=embedding_model_id())
+    cached = cache.get(key)
+    if cached is not None:
+        return IngestJob.from_vectors(file_name, *cached)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_name)[1]) as tmp_file:
+        tmp_file.write(file_bytes)
+    return IngestJob(file_name).start(
+        tmp_file.name, CHUNK_SIZE, CHUNK_OVERLAP,
+        on_complete=lambda chunks, vectors: cache.put(key, chunks, vectors)
+    )
+
+# -------------- MEAL ANALYSIS ------------------------
+
+def meal_item_prompt(thyroid_type, item, impact, nutrients):
+    return (f"A patient with '{thyroid_type}' is eating '{item}'. Its known thyroid impact is '{impact}' and its nutrients are: {nutrients}. Briefly explain if this food is generally beneficial, neutral, or should be consumed with caution for their condition and why. Provide one simple suggestion for a healthy pairing or alternative.")
+
+def meal_rows(catalog, items):
+    """item -> (thyroid impact, nutrient summary); items not in the catalog are tagged from their name."""
+    rows = {}
+    for item in items:
+        if item in catalog.row_by_name:
+            rows[item] = (catalog.impact(item), catalog.nutrient_summary(item))
+        else:
+            rows[item] = (tag_thyroid_impact(item), "Not available")
+    return rows
+
+
+def analyze_meal_batched(chat_model, thyroid_type, rows):
+    """Analyzes every item in one request. rows maps item -> (impact, nutrients); returns item -> analysis."""
+    listing = "\n".join(f"- {item} | Thyroid impact: {impact} | {nutrients}" for item, (impact, nutrients) in rows.items())
+    prompt = (f"A patient with '{thyroid_type}' is eating the following meal:\n{listing}\n\n"
+              "For EACH item, briefly explain if this food is generally beneficial, neutral, or should be consumed with caution for their condition and why, "
+              "and give one simple suggestion for a healthy pairing or alternative. "
+              "Reply ONLY with a JSON object mapping each item name, exactly as written above, to its analysis text.")
+    response = chat_model.invoke(prompt)
+    reply = response.content if hasattr(response, "content") else str(response)
+    parsed = json.loads(reply[reply.find("{"):reply.rfind("}") + 1])
+    return {item: str(parsed[item]) for item in rows if parsed.get(item)}
@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """An event loop on a daemon thread, so synchronous callers (Streamlit pages) can use ThyBotService.
+
+    Each call is scheduled from the caller's thread, so it runs in a copy of the caller's
+    context and perf spans land in the caller's trace.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="thybot-service-loop", daemon=True).start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, agen):
+        """Turns an async generator into a blocking one."""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
@@ -0,0 +1,42 @@
+import pytest
+from starlette.testclient import TestClient
+
+from service.api import app
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def session_id(client):
+    sid = client.post("/sessions").json()["session_id"]
+    yield sid
+    client.delete(f"/sessions/{sid}")
+
+
+@pytest.mark.parametrize("message", [5, None, "", "   ", ["What is TSH?"]])
+def test_bad_chat_message_is_rejected_and_not_recorded(client, session_id, message):
+    response = client.post(f"/sessions/{session_id}/chat", json={"message": message, "stream": False})
+    assert response.status_code == 400
+    assert client.get(f"/sessions/{session_id}/chat").json()["messages"] == []
+
+
+@pytest.mark.parametrize("labs", [{"tsh": None, "t3": 1.2, "t4": 8}, {"tsh": "high", "t3": 1.2, "t4": 8}, {"tsh": True, "t3": 1.2, "t4": 8}, {"t3": 1.2, "t4": 8}])
+def test_bad_lab_values_are_rejected(client, session_id, labs):
+    assert client.post("/profile/classify", json=labs).status_code == 400
+    assert client.put(f"/sessions/{session_id}/profile", json=labs).status_code == 400
+
+
+def test_profile_is_classified(client, session_id):
+    labs = {"tsh": 7.5, "t3": 1.0, "t4": 5}
+    thyroid_type = client.post("/profile/classify", json=labs).json()["thyroid_type"]
+    profile = client.put(f"/sessions/{session_id}/profile", json=dict(labs, name="A")).json()
+    assert profile["thyroid_type"] == thyroid_type
+    assert profile["name"] == "A"
+
+
+def test_unknown_session_is_404(client):
+    assert client.post("/sessions/nope/chat", json={"message": "What is TSH?"}).status_code == 404
@@ -0,0 +1,52 @@
+import os
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def render_events(root, events):
+    import sys
+    sys.path.insert(0, root)
+    import streamlit as st
+    from app import render_reply_events
+
+    with st.chat_message("assistant"):
+        render_reply_events(iter(events))
+
+
+def run_events(events):
+    at = AppTest.from_function(render_events, args=(ROOT, events), default_timeout=30).run()
+    assert not at.exception
+    return at
+
+
+def test_low_confidence_reply_keeps_web_answer():
+    at = run_events([
+        {"event": "token", "text": "I am not sure "},
+        {"event": "token", "text": "about that."},
+        {"event": "status", "text": "Searching the web..."},
+        {"event": "answer", "text": "TSH is made by the pituitary.", "sources": [{"title": "NIH", "link": "https://nih.gov"}]},
+        {"event": "done"},
+    ])
+    shown = [m.value for m in at.markdown]
+    assert "I am not sure about that." in shown
+    assert "TSH is made by the pituitary." in shown
+    assert not at.info
+    assert at.expander[0].label == "Sources"
+
+
+def test_error_after_partial_reply_is_shown():
+    at = run_events([
+        {"event": "token", "text": "Levothyroxine is"},
+        {"event": "error", "message": "The AI service is busy right now. Please try again."},
+        {"event": "done"},
+    ])
+    shown = [m.value for m in at.markdown]
+    assert "Levothyroxine is" in shown
+    assert "The AI service is busy right now. Please try again." in shown
+
+
+def test_streamed_reply_drops_cursor():
+    at = run_events([{"event": "token", "text": "Hello"}, {"event": "token", "text": " there"}, {"event": "done"}])
+    assert [m.value for m in at.markdown] == ["Hello there"]
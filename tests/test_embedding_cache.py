@@ -0,0 +1,63 @@
+import os
+import shutil
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from utils import embedding_cache
+from utils.embedding_cache import EmbeddingCache
+
+
+def store(cache, key, n=2):
+    chunks = [Document(page_content=f"{key} chunk {i}", metadata={"page": i}) for i in range(n)]
+    cache.put(key, chunks, np.ones((n, 4), dtype="float32"))
+
+
+def test_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    assert cache.get("doc") is None
+    store(cache, "doc")
+    chunks, vectors = cache.get("doc")
+    assert [c.metadata["page"] for c in chunks] == [0, 1]
+    assert vectors.shape == (2, 4)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    store(cache, "old")
+    cache.max_bytes = sum(size for _, size, _ in cache._entries()) + 1
+    os.utime(tmp_path / "old", (1, 1))
+    store(cache, "new")
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    assert cache.evictions == 1
+
+
+def test_entry_evicted_during_get_is_a_miss(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path))
+    store(cache, "doc")
+
+    def evicted_first(path, times):
+        # Another session's put() evicts the entry between the reads and the touch
+        shutil.rmtree(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(embedding_cache.os, "utime", evicted_first)
+    assert cache.get("doc") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_entry_evicted_during_stats_is_skipped(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path))
+    store(cache, "kept")
+    store(cache, "gone")
+    scandir = os.scandir
+
+    def vanishing(path):
+        if path.endswith("gone"):
+            raise FileNotFoundError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(embedding_cache.os, "scandir", vanishing)
+    assert cache.stats()["entries"] == 1
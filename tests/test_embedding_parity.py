@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils import rag_utils
+
+pytest.importorskip("onnxruntime")
+transformers = pytest.importorskip("transformers")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# int8 weights move the vectors a little; fp32 should match torch to rounding
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+
+@pytest.fixture(scope="module")
+def chunks():
+    from pypdf import PdfReader
+    reader = PdfReader(os.path.join(ROOT, "data", "thyroid_function_tests_faq.pdf"))
+    text = " ".join(" ".join((page.extract_text() or "").split()) for page in reader.pages[:3])
+    # A few 1000-character chunks, as uploads are split, plus one past the 256-token truncation
+    return [text[i:i + 1000] for i in range(0, 6000, 1000)] + ["What is TSH?", text[:4000]]
+
+
+@pytest.fixture(scope="module")
+def reference(chunks):
+    name = rag_utils.EMBEDDING_MODEL_NAME
+    try:
+        transformers.AutoConfig.from_pretrained(name if "/" in name else f"sentence-transformers/{name}", local_files_only=True)
+    except OSError:
+        pytest.skip(f"{name} weights are not in the local Hugging Face cache")
+    vectors = np.asarray(rag_utils.get_embedding_model("torch").embed_documents(chunks), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("label, quantize", [("onnx", False), ("onnx-int8", True)])
+def test_onnx_matches_torch(chunks, reference, label, quantize):
+    vectors = np.asarray(rag_utils.get_embedding_model("onnx", quantize).embed_documents(chunks), dtype=np.float32)
+    assert vectors.shape == reference.shape
+    cosine = np.sum(vectors * reference, axis=1)
+    assert cosine.min() >= MIN_COSINE[label], f"{label}: min cosine {cosine.min():.4f} vs torch"
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from utils.food_catalog import FOOD_DATA_PATH, NUTRIENT_COLUMNS, FoodCatalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return FoodCatalog.from_csv(os.path.join(ROOT, FOOD_DATA_PATH))
+
+
+def dishes(parsed):
+    return [(quantity, dish) for _, quantity, dish, _ in parsed]
+
+
+def test_backlog_example_resolves_every_part(catalog):
+    parsed = catalog.parse_meal("2 rotis, dal and paneer")
+    assert dishes(parsed) == [(2.0, "Chapati/Roti"), (1, "Mixed dal"), (1, "Paneer curry")]
+    # Plain words default to their plain dish but still offer the alternatives
+    assert parsed[0][3] == []
+    assert parsed[1][3] and parsed[2][3]
+
+
+def test_with_separates_items(catalog):
+    parsed = catalog.parse_meal("poha with a glass of milk")
+    assert [part for part, _, _, _ in parsed] == ["poha", "a glass of milk"]
+    assert parsed[0][2] == "Poha"
+
+
+def test_with_inside_a_dish_name_is_kept(catalog):
+    assert dishes(catalog.parse_meal("2 poha with curd")) == [(2.0, "Poha with curd (Poha aur dahi)")]
+    assert dishes(catalog.parse_meal("cornflakes with milk")) == [(1, "Cornflakes with milk")]
+
+
+def test_word_without_a_plain_dish_stays_ambiguous(catalog):
+    (_, _, dish, candidates), = catalog.parse_meal("milk")
+    assert dish is None
+    assert "Milk cake" in candidates
+
+
+def test_typos_and_aliases_resolve(catalog):
+    assert catalog.resolve("chapatti")[0] == "Chapati/Roti"
+    assert catalog.resolve("palak paneer") == ("Spinach paneer (Palak paneer)", [])
+
+
+def test_meal_totals_ignore_missing_nutrients(catalog):
+    totals = catalog.meal_totals({"Mixed dal": 1, "Chapati/Roti": 2})
+    assert set(totals) == set(NUTRIENT_COLUMNS)
+    assert all(value == value for value in totals.values())  # No NaN
@@ -0,0 +1,69 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from utils import kb_index
+from utils.kb_index import MappedFlatIndex, build_kb_index, load_kb_index, search_kb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class HashEmbeddings:
+    """Deterministic stand-in for MiniLM: a bag of hashed words."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.zeros(64, dtype="float32")
+        for word in text.lower().split():
+            vector[hash(word) % 64] += 1
+        return vector.tolist()
+
+
+@pytest.fixture
+def kb_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(kb_index, "get_embedding_model", HashEmbeddings)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    shutil.copy(os.path.join(ROOT, "data", "thyroid_function_tests_faq.pdf"), data_dir)
+    return {
+        "index_path": str(data_dir / "kb_index.faiss"),
+        "chunks_path": str(data_dir / "kb_chunks.jsonl"),
+        "manifest_path": str(data_dir / "kb_manifest.json"),
+        "vectors_path": str(data_dir / "kb_vectors.npy"),
+    }
+
+
+def build(kb_paths, index_type, index_params=None):
+    data_dir = os.path.dirname(kb_paths["index_path"])
+    return build_kb_index(data_dir, index_type=index_type, index_params=index_params, **kb_paths)
+
+
+def test_flat_index_is_served_from_the_vector_file(kb_paths):
+    build(kb_paths, "hnsw")
+    assert os.path.exists(kb_paths["index_path"])
+    result = build(kb_paths, "flat")
+    assert result["embedded"] == []  # Unchanged PDF, vectors reused
+    # The flat build writes no FAISS file and removes the HNSW one
+    assert not os.path.exists(kb_paths["index_path"])
+    index, chunks = load_kb_index(**kb_paths)
+    assert isinstance(index, MappedFlatIndex)
+    assert search_kb(chunks[3]["text"], (index, chunks), k=1)[0]["text"] == chunks[3]["text"]
+
+
+def test_hnsw_index_needs_its_faiss_file(kb_paths):
+    build(kb_paths, "hnsw")
+    index, chunks = load_kb_index(**kb_paths)
+    assert index.ntotal == len(chunks)
+    os.remove(kb_paths["index_path"])
+    assert load_kb_index(**kb_paths) is None
+
+
+def test_mapped_flat_index_pads_like_faiss():
+    vectors = np.eye(3, dtype="float32")
+    scores, ids = MappedFlatIndex(vectors).search(vectors[[1]], 5)
+    assert ids[0, 0] == 1 and set(ids[0, :3]) == {0, 1, 2}
+    assert (ids[0, 3:] == -1).all() and np.isneginf(scores[0, 3:]).all()
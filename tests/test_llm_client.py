@@ -0,0 +1,143 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from models import llm_client
+from models.llm_client import LLMUnavailableError, ResilientLLMClient
+
+MESSAGES = [{"role": "user", "content": "What is TSH?"}]
+
+
+class APIError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers={"retry-after": retry_after} if retry_after else {})
+
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeStream:
+    def __init__(self, deltas):
+        self.chunks = iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=d))]) for d in deltas])
+        self.closed = False
+
+    def __iter__(self):
+        return self.chunks
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCreate:
+    """Plays back one scripted outcome per call: an exception to raise or a response to return."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, messages, **params):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(llm_client.time, "sleep", slept.append)
+    return slept
+
+
+def make_client(create, **options):
+    return ResilientLLMClient(create, requests_per_minute=1000, tokens_per_minute=10 ** 6, **options)
+
+
+def test_rate_limited_call_is_retried(sleeps):
+    create = FakeCreate(APIError(429), completion("TSH is a pituitary hormone."))
+    client = make_client(create)
+    assert client.complete(MESSAGES, model="m") == "TSH is a pituitary hormone."
+    assert create.calls == 2
+    assert len(sleeps) == 1
+    stats = client.metrics.snapshot()
+    assert (stats["retries"], stats["rate_limited"], stats["failures"], stats["in_flight"]) == (1, 1, 0, 0)
+
+
+def test_retry_after_is_honoured_up_to_the_backoff_cap(sleeps):
+    create = FakeCreate(APIError(503, retry_after="2"), APIError(429, retry_after="600"), completion("ok"))
+    client = make_client(create, backoff_cap=5.0)
+    assert client.complete(MESSAGES) == "ok"
+    assert sleeps == [2.0, 5.0]
+
+
+def test_client_errors_are_not_retried(sleeps):
+    create = FakeCreate(APIError(400), completion("unused"))
+    client = make_client(create)
+    with pytest.raises(APIError):
+        client.complete(MESSAGES)
+    assert create.calls == 1
+    assert not sleeps
+    assert client.metrics.snapshot()["failures"] == 1
+
+
+def test_retries_give_up_with_unavailable_error(sleeps):
+    create = FakeCreate(*[APIError(500)] * 3)
+    client = make_client(create, max_retries=2)
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+    assert create.calls == 3
+
+
+def test_identical_concurrent_calls_share_one_request():
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    def create(messages, **params):
+        calls.append(messages)
+        entered.set()
+        release.wait(5)
+        return completion("shared")
+
+    client = make_client(create)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.complete(MESSAGES, model="m"))) for _ in range(3)]
+    threads[0].start()
+    assert entered.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while client.metrics.snapshot()["coalesced"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["shared"] * 3
+    assert len(calls) == 1
+    assert client.metrics.snapshot()["coalesced"] == 2
+
+
+def test_closed_stream_releases_its_slot_and_closes_upstream():
+    upstream = FakeStream(["Levo", "thyroxine", " is T4."])
+    client = make_client(FakeCreate(upstream, FakeStream(["next"])), max_concurrency=1)
+    stream = client.stream(MESSAGES)
+    assert next(stream) == "Levo"
+    stream.close()
+    assert upstream.closed
+    assert client.metrics.snapshot()["in_flight"] == 0
+    # The only slot is free again
+    assert list(client.stream(MESSAGES)) == ["next"]
+
+
+def test_stream_retries_before_the_first_chunk(sleeps):
+    upstream = FakeStream(["ok"])
+    create = FakeCreate(APIError(429), upstream)
+    client = make_client(create)
+    assert list(client.stream(MESSAGES)) == ["ok"]
+    assert create.calls == 2
+    assert upstream.closed
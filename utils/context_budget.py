@@ -0,0 +1,114 @@
+import os
+import re
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get("THYBOT_PROMPT_TOKEN_BUDGET", "3000"))
+# Tokens per chat message for role/formatting, on top of its content
+MESSAGE_OVERHEAD = 4
+# Turns always kept verbatim, whatever the budget
+MIN_RECENT_MESSAGES = 2
+# Once summary + verbatim history pass SUMMARY_TRIGGER of the history budget, older turns are
+# folded into the summary until the verbatim part is under SUMMARY_TARGET. The gap is how far
+# the conversation can grow before the next summary call.
+SUMMARY_TRIGGER = 0.8
+SUMMARY_TARGET = 0.3
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Approximate Llama 3 token count: words and punctuation, plus extra pieces for long words."""
+    if not text:
+        return 0
+    return sum(1 + len(piece) // 6 for piece in _TOKEN_PIECES.findall(text))
+
+
+def messages_tokens(messages):
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+
+
+def fit_chunks(texts, budget):
+    """Keeps texts in rank order while they fit in budget tokens."""
+    kept, used = [], 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            break
+        kept.append(text)
+        used += cost
+    return kept
+
+
+def new_summary_state():
+    return {"upto": 0, "summary": ""}
+
+
+def _summarize(summary, messages, summarize):
+    transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+    prompt = (
+        "Condense this conversation between a patient and ThyBot, a thyroid-health assistant, into a brief summary "
+        "(under 120 words). Keep lab values, diagnoses, medications, foods and open questions.\n\n"
+        + (f"EARLIER SUMMARY:\n{summary}\n\n" if summary else "")
+        + f"NEW TURNS:\n{transcript}"
+    )
+    return summarize(prompt).strip()
+
+
+def _fitting_start(messages, budget, floor):
+    """Index of the oldest message (not before floor) such that messages[index:] fit in budget.
+
+    The newest MIN_RECENT_MESSAGES are always kept, whatever they cost.
+    """
+    start, used = len(messages), 0
+    while start > floor:
+        cost = estimate_tokens(messages[start - 1]["content"]) + MESSAGE_OVERHEAD
+        if used + cost > budget and len(messages) - start >= MIN_RECENT_MESSAGES:
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+def _summary_cost(state):
+    return estimate_tokens(state["summary"]) + MESSAGE_OVERHEAD if state["summary"] else 0
+
+
+def build_history(messages, budget, state):
+    """Fits chat history into budget tokens: the rolling summary, then the newest messages that fit.
+
+    messages is the full history, newest last. state (from new_summary_state, kept in the
+    session) holds the summary and how many leading messages it covers. This never calls the
+    LLM; refresh_summary grows the summary after the reply. Returns the messages to send, with
+    the summary as a leading system message.
+    """
+    if state["upto"] > len(messages):
+        state.update(new_summary_state())  # History was cleared
+    state["budget"] = budget
+
+    start = _fitting_start(messages, budget - _summary_cost(state), state["upto"])
+    history = []
+    if state["summary"]:
+        history.append({"role": "system", "content": f"Summary of the earlier conversation: {state['summary']}"})
+    history.extend({"role": m["role"], "content": m["content"]} for m in messages[start:])
+    return history
+
+
+def refresh_summary(messages, state, summarize):
+    """Folds older turns into the summary once history nears the budget of the last build_history.
+
+    Meant to run after a reply has been sent, so the summary call never delays an answer.
+    Each message is summarized once; summarize(prompt) -> text. Returns whether it summarized.
+    """
+    budget = state.get("budget")
+    if budget is None or state["upto"] > len(messages):
+        return False
+    if _summary_cost(state) + messages_tokens(messages[state["upto"]:]) <= SUMMARY_TRIGGER * budget:
+        return False
+    upto = _fitting_start(messages, SUMMARY_TARGET * budget, state["upto"])
+    if upto <= state["upto"]:
+        return False
+    try:
+        state["summary"] = _summarize(state["summary"], messages[state["upto"]:upto], summarize)
+        state["upto"] = upto
+    except Exception:
+        return False  # build_history drops what doesn't fit until a later refresh succeeds
+    return True
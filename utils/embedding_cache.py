@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+CACHE_DIR = os.environ.get("THYBOT_EMBED_CACHE_DIR", os.path.join(".cache", "doc_embeddings"))
+MAX_CACHE_MB = float(os.environ.get("THYBOT_EMBED_CACHE_MB", "512"))
+
+
+def document_cache_key(file_bytes, chunk_size, chunk_overlap, model_name="all-MiniLM-L6-v2"):
+    """Content address for an upload: same bytes + same chunking + same model -> same key."""
+    h = hashlib.sha256(file_bytes)
+    h.update(f"|{chunk_size}|{chunk_overlap}|{model_name}".encode())
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """Disk-backed cache of (chunks, vectors) per document, evicted LRU by total size."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=int(MAX_CACHE_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        from langchain.docstore.document import Document
+        entry = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry, "chunks.json"), encoding="utf-8") as f:
+                records = json.load(f)
+            vectors = np.load(os.path.join(entry, "vectors.npy"))
+            # Touch the entry so eviction treats it as recently used
+            os.utime(entry, None)
+        except (FileNotFoundError, ValueError):
+            # Not cached, or evicted by another session's put() while it was being read
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        chunks = [Document(page_content=r["page_content"], metadata=r["metadata"]) for r in records]
+        return chunks, vectors
+
+    def put(self, key, chunks, vectors):
+        records = [{"page_content": c.page_content, "metadata": c.metadata} for c in chunks]
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        with open(os.path.join(tmp, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False)
+        np.save(os.path.join(tmp, "vectors.npy"), np.asarray(vectors, dtype="float32"))
+        try:
+            os.rename(tmp, self._entry_dir(key))
+        except OSError:
+            # Another session stored the same document first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".tmp-") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+                entries.append((os.path.getmtime(path), size, path))
+            except FileNotFoundError:
+                continue  # Evicted while we were listing
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                self.evictions += 1
+
+    def stats(self):
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size_mb": sum(size for _, size, _ in entries) / (1024 * 1024),
+            "max_mb": self.max_bytes / (1024 * 1024),
+        }
@@ -0,0 +1,218 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+
+FOOD_DATA_PATH = "data/Indian_Food_Nutrition_Processed.csv"
+
+NUTRIENT_COLUMNS = [
+    "Calories (kcal)", "Carbohydrates (g)", "Protein (g)", "Fats (g)", "Free Sugar (g)", "Fibre (g)",
+    "Sodium (mg)", "Calcium (mg)", "Iron (mg)", "Vitamin C (mg)", "Folate (µg)",
+]
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "half": 0.5, "quarter": 0.25,
+}
+
+# Separators between items in a free-text meal ("2 rotis, dal and paneer")
+MEAL_SEPARATORS = re.compile(r",|;|\+|&|\band\b|\bplus\b", re.IGNORECASE)
+# Also separates items ("poha with a glass of milk"), unless the whole part names a dish ("Poha with curd")
+WITH_SEPARATOR = re.compile(r"\bwith\b", re.IGNORECASE)
+QUANTITY = re.compile(r"^\s*(\d+(?:\.\d+)?|[a-z]+)\s+(.*)$", re.IGNORECASE)
+# A fuzzy match that doesn't name the whole dish is only taken if it beats the runner-up by this much
+AMBIGUITY_MARGIN = 0.15
+# A single word like "dal" defaults to the dish that adds only these to it ("Mixed dal", "Boiled rice")
+GENERIC_DISH_WORDS = {"plain", "mixed", "boiled", "steamed", "hot", "curry"}
+# How a query matched a dish, strongest first (see FoodCatalog._ranked)
+MATCH_KINDS = ("exact", "generic", "partial", "fuzzy")
+SERVING_UNITS = re.compile(r"^(?:(?:cups?|bowls?|plates?|glass(?:es)?|pieces?|slices?|servings?|katoris?|small|medium|large)\s+)+(?:of\s+)?", re.IGNORECASE)
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _stem(word):
+    return word.rstrip("s")
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _aliases(name):
+    # "Spinach paneer (Palak paneer)" -> full name, "spinach paneer", "palak paneer";
+    # "Chapati/Roti" -> also "chapati", "roti"
+    aliases = {_normalize(name)}
+    for part in re.split(r"[()/]", name):
+        part = _normalize(part)
+        if part:
+            aliases.add(part)
+    return aliases
+
+
+def _parse_quantity(part):
+    # "2 rotis" -> (2.0, "rotis"); "a bowl of dal" -> (1, "dal")
+    quantity, query = 1, part
+    m = QUANTITY.match(part)
+    if m:
+        token = m.group(1).lower()
+        if token.replace(".", "", 1).isdigit():
+            quantity, query = float(token), m.group(2)
+        elif token in NUMBER_WORDS:
+            quantity, query = NUMBER_WORDS[token], m.group(2)
+    return quantity, SERVING_UNITS.sub("", query)
+
+
+class FoodCatalog:
+    """Indexed view of the food CSV: name lookup, nutrient matrix and a trigram fuzzy-match index."""
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        self.names = df["Dish Name"].tolist()
+        self.sorted_names = sorted(self.names)
+        self.row_by_name = {name: i for i, name in enumerate(self.names)}
+        self.impacts = df["Thyroid_Impact"].tolist()
+        self.nutrients = df[NUTRIENT_COLUMNS].to_numpy(dtype=np.float64)
+
+        self._alias_rows = defaultdict(set)
+        self._alias_grams = {}
+        self._alias_words = {}
+        self._alias_word_sets = {}
+        self._postings = defaultdict(list)
+        for row, name in enumerate(self.names):
+            for alias in _aliases(name):
+                if alias not in self._alias_grams:
+                    grams = _trigrams(alias)
+                    self._alias_grams[alias] = len(grams)
+                    self._alias_words[alias] = [_stem(w) for w in alias.split()]
+                    self._alias_word_sets[alias] = set(self._alias_words[alias])
+                    for g in grams:
+                        self._postings[g].append(alias)
+                self._alias_rows[alias].add(row)
+
+    @classmethod
+    def from_csv(cls, path=FOOD_DATA_PATH):
+        import pandas as pd
+        return cls(pd.read_csv(path))
+
+    def nutrient_summary(self, name):
+        calories, _, protein, _, sugar = self.nutrients[self.row_by_name[name], :5]
+        return f"Calories: {calories:.0f} kcal | Protein: {protein:g}g | Sugar: {sugar:g}g"
+
+    def impact(self, name):
+        return self.impacts[self.row_by_name[name]]
+
+    def _ranked(self, query, min_score):
+        """[(row, score, kind)] best first.
+
+        kind is "exact", "generic" (a plain form of a one-word query), "partial" (the query is part
+        of a longer name) or "fuzzy".
+        """
+        query = _normalize(query)
+        if not query:
+            return []
+        grams = _trigrams(query)
+        shared = defaultdict(int)
+        for g in grams:
+            for alias in self._postings.get(g, ()):
+                shared[alias] += 1
+        words = {_stem(w) for w in query.split()}
+        best = {}
+        for alias, count in shared.items():
+            dice = 2 * count / (len(grams) + self._alias_grams[alias])
+            alias_words = self._alias_words[alias]
+            contains_query = words <= self._alias_word_sets[alias]
+            # Short queries share few trigrams with long names; dishes containing every word still count
+            if dice < min_score and not contains_query:
+                continue
+            # Weigh by how much of the dish name was typed, so "milk" doesn't fully match "Milk cake"
+            covered = sum(w in words for w in alias_words) / len(alias_words)
+            score = dice * (0.5 + 0.5 * covered)
+            # Prefer dishes that contain every word typed, e.g. "dal" -> "Mixed dal" over "Dalma"
+            if contains_query:
+                score += 0.25
+            # The query names this dish exactly, its plain form ("dal" -> "Mixed dal"),
+            # or only part of a longer name ("eggs" in "Egg nog")
+            extra_words = self._alias_word_sets[alias] - words
+            if not extra_words:
+                kind = "exact"
+            elif not contains_query:
+                kind = "fuzzy"
+            elif len(words) == 1 and extra_words <= GENERIC_DISH_WORDS:
+                kind = "generic"
+            else:
+                kind = "partial"
+            for row in self._alias_rows[alias]:
+                best_score, best_kind = best.get(row, (0, "fuzzy"))
+                # A row keeps its best score and the strongest way any of its names matched
+                best[row] = (max(score, best_score), min(kind, best_kind, key=MATCH_KINDS.index))
+        # Ties go to the shorter (more generic) dish name
+        ranked = sorted(best.items(), key=lambda rs: (-rs[1][0], len(self.names[rs[0]]), self.names[rs[0]]))
+        return [(row, score, kind) for row, (score, kind) in ranked]
+
+    def match(self, query, limit=5, min_score=0.35):
+        """Returns [(dish name, score)] best first: trigram Dice similarity, weighted by how much of the name the query covers."""
+        return [(self.names[row], score) for row, score, _ in self._ranked(query, min_score)[:limit]]
+
+    def resolve(self, query, limit=5, min_score=0.35):
+        """Returns (dish name or None, [candidate dish names]).
+
+        A dish is picked when the query names it (by any of its names), or is a fuzzy match
+        (e.g. a typo) that clearly beats the runner-up; candidates is then empty. A single word
+        with a plain form in the catalog ("dal" -> "Mixed dal", "rice" -> "Boiled rice") defaults
+        to it, the shortest if there are several, and candidates lists the other dishes it could
+        be. Otherwise the dish is None and candidates are the closest names, so "milk" isn't
+        silently read as "Milk cake".
+        """
+        ranked = self._ranked(query, min_score)
+        if not ranked:
+            return None, []
+        _, top_score, kind = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if kind == "exact" or (kind == "fuzzy" and top_score - runner_up >= AMBIGUITY_MARGIN):
+            return self.names[ranked[0][0]], []
+        generic = [row for row, _, row_kind in ranked if row_kind == "generic"]
+        if generic:
+            dish = min(generic, key=lambda row: (len(self.names[row]), self.names[row]))
+            return self.names[dish], [self.names[row] for row, _, _ in ranked if row != dish][:limit]
+        return None, [self.names[row] for row, _, _ in ranked[:limit]]
+
+    def parse_meal(self, text):
+        """Resolves free text like "2 rotis, dal and paneer" to [(part, quantity, dish name or None, candidates)].
+
+        candidates lists the closest dishes when a part is ambiguous, or the alternatives when a
+        one-word part defaulted to its plain form (see resolve); it is empty when the part named
+        a dish or matched nothing.
+        """
+        parsed = []
+        for part in MEAL_SEPARATORS.split(text):
+            part = part.strip()
+            if not part:
+                continue
+            subparts = [part]
+            if WITH_SEPARATOR.search(part) and not self._names_dish(_parse_quantity(part)[1]):
+                subparts = [p.strip() for p in WITH_SEPARATOR.split(part) if p.strip()]
+            for subpart in subparts:
+                quantity, query = _parse_quantity(subpart)
+                dish, candidates = self.resolve(query, limit=3)
+                parsed.append((subpart, quantity, dish, candidates))
+        return parsed
+
+    def _names_dish(self, query):
+        ranked = self._ranked(query, 1.0)
+        return bool(ranked) and ranked[0][2] == "exact"
+
+    def meal_totals(self, quantities):
+        """Sums nutrients for {dish name: servings} in one matrix-vector product.
+
+        Values missing from the CSV count as zero, so one dish without a Folate figure
+        doesn't turn the meal's Folate total into NaN.
+        """
+        if not quantities:
+            return dict.fromkeys(NUTRIENT_COLUMNS, 0.0)
+        rows = np.fromiter((self.row_by_name[name] for name in quantities), dtype=np.intp, count=len(quantities))
+        servings = np.fromiter(quantities.values(), dtype=np.float64, count=len(quantities))
+        return dict(zip(NUTRIENT_COLUMNS, (servings @ np.nan_to_num(self.nutrients[rows])).tolist()))
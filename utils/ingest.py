@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from utils.perf import in_current_context, span
+from utils.rag_utils import TRAINED_INDEX_TYPES, build_index, embed_texts, index_config_from_env, retrieve_relevant_chunks
+
+EMBED_BATCH_SIZE = 64
+PAGES_PER_TASK = 8
+# Below this many pages a process pool costs more to start than it saves
+PARALLEL_MIN_PAGES = 24
+MAX_EXTRACT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Page ranges one document may have queued or running in the pool at a time
+MAX_PENDING_TASKS = 2 * MAX_EXTRACT_WORKERS
+
+# One extraction pool per process, shared by every upload
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def _extract_pages(path, start, stop):
+    # Runs in a worker process, so it imports pypdf itself
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def _pdf_page_count(path):
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _get_extract_pool():
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # spawn, not fork: the parent has torch/tokenizer threads that don't survive a fork
+            ctx = multiprocessing.get_context("spawn")
+            _extract_pool = ProcessPoolExecutor(max_workers=MAX_EXTRACT_WORKERS, mp_context=ctx)
+        return _extract_pool
+
+
+def _reset_extract_pool(pool):
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is pool:
+            _extract_pool = None
+
+
+def iter_pdf_pages(path, total_pages):
+    """Yields (page number, text) in order, extracting page ranges in the shared process pool.
+
+    At most MAX_PENDING_TASKS ranges are in flight, so a large PDF doesn't queue all of
+    its pages ahead of other uploads or pile up extracted text faster than it is embedded.
+    """
+    ranges = [(start, min(start + PAGES_PER_TASK, total_pages)) for start in range(0, total_pages, PAGES_PER_TASK)]
+    if total_pages < PARALLEL_MIN_PAGES:
+        for start, stop in ranges:
+            yield from _extract_pages(path, start, stop)
+        return
+    pool = _get_extract_pool()
+    pending, ranges = deque(), iter(ranges)
+    try:
+        while True:
+            for start, stop in ranges:
+                pending.append(pool.submit(_extract_pages, path, start, stop))
+                if len(pending) >= MAX_PENDING_TASKS:
+                    break
+            if not pending:
+                return
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        # A worker died; the next upload starts a fresh pool
+        _reset_extract_pool(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_document_pages(path, file_name):
+    """Yields (total pages, page number, text) for a PDF, DOCX or TXT file."""
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".pdf":
+        total = _pdf_page_count(path)
+        for page, text in iter_pdf_pages(path, total):
+            yield total, page, text
+    elif extension in (".docx", ".txt"):
+        from langchain_community.document_loaders import Docx2txtLoader, TextLoader
+        loader = Docx2txtLoader(path) if extension == ".docx" else TextLoader(path)
+        documents = loader.load()
+        for page, doc in enumerate(documents):
+            yield len(documents), page, doc.page_content
+    else:
+        raise ValueError(f"Unsupported file type: {extension}")
+
+
+def iter_chunk_batches(path, file_name, chunk_size, chunk_overlap, batch_size=EMBED_BATCH_SIZE):
+    """Splits pages as they arrive and yields (pages done, total pages, [chunks]) in fixed-size batches."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    batch, pages_done, total = [], 0, 0
+    for total, page, text in iter_document_pages(path, file_name):
+        batch.extend(splitter.create_documents([text], metadatas=[{"source": file_name, "page": page}]))
+        pages_done += 1
+        while len(batch) >= batch_size:
+            yield pages_done, total, batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield pages_done, total, batch
+
+
+class IngestJob:
+    """Builds a document's hybrid index in a background thread, one embedded batch at a time.
+
+    The index is searchable as soon as the first batch lands, so chat can start
+    before the whole document has been read. Trained index types (IVF-PQ) need the
+    whole document to train on: until it has been read, batches go into a flat index,
+    which is then replaced by the configured one.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.index = None
+        self.pages_done = 0
+        self.total_pages = 0
+        self.chunks_done = 0
+        self.error = None
+        self.done = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_vectors(cls, file_name, chunks, vectors):
+        """A finished job for a document whose chunks and vectors are already known."""
+        job = cls(file_name)
+        job.index = build_index(chunks, vectors)
+        job.chunks_done = len(chunks)
+        job.done = True
+        return job
+
+    @property
+    def progress(self):
+        return self.pages_done / self.total_pages if self.total_pages else 0.0
+
+    def start(self, path, chunk_size, chunk_overlap, on_complete=None, remove_file=True):
+        """Starts ingesting path; on_complete(chunks, vectors) runs once everything is indexed."""
+        self._thread = threading.Thread(
+            target=in_current_context(self._run), args=(path, chunk_size, chunk_overlap, on_complete, remove_file), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _run(self, path, chunk_size, chunk_overlap, on_complete, remove_file):
+        all_chunks, all_vectors = [], []
+        kind, params = index_config_from_env()
+        trained = kind in TRAINED_INDEX_TYPES
+        batch_kind, batch_params = ("flat", {}) if trained else (kind, params)
+        try:
+            for pages_done, total, chunks in iter_chunk_batches(path, self.file_name, chunk_size, chunk_overlap):
+                vectors = np.asarray(embed_texts([c.page_content for c in chunks]), dtype="float32")
+                with self._lock, span("index.add"):
+                    if self.index is None:
+                        self.index = build_index(chunks, vectors, batch_kind, batch_params)
+                    else:
+                        self.index.add(chunks, vectors)
+                    self.pages_done, self.total_pages = pages_done, total
+                    self.chunks_done += len(chunks)
+                all_chunks.extend(chunks)
+                all_vectors.append(vectors)
+            if self.index is None:
+                raise ValueError(f"No text could be extracted from {self.file_name}")
+            all_vectors = np.vstack(all_vectors)
+            if trained:
+                # Same index as from_vectors builds; searches use the flat one meanwhile
+                with span("index.train"):
+                    index = build_index(all_chunks, all_vectors, kind, params)
+                with self._lock:
+                    self.index = index
+            if on_complete:
+                on_complete(all_chunks, all_vectors)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            if remove_file:
+                os.remove(path)
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done
+
+    def search(self, query, k=4):
+        with self._lock:
+            if self.index is None:
+                return []
+            return retrieve_relevant_chunks(query, self.index, k=k)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from utils.perf import span
+from utils.rag_utils import apply_search_params, embedding_model_id, get_embedding_model, index_config_from_env, make_faiss_index, resolve_index_params
+
+DATA_DIR = "data"
+# Only written for HNSW and IVF-PQ; the flat index is searched straight from VECTORS_PATH
+INDEX_PATH = os.path.join(DATA_DIR, "kb_index.faiss")
+CHUNKS_PATH = os.path.join(DATA_DIR, "kb_chunks.jsonl")
+# Exact float32 vectors, kept so rebuilds and compressed (lossy) indexes can reuse them
+VECTORS_PATH = os.path.join(DATA_DIR, "kb_vectors.npy")
+MANIFEST_PATH = os.path.join(DATA_DIR, "kb_manifest.json")
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _embed_texts(texts):
+    import faiss
+    vectors = np.asarray(get_embedding_model().embed_documents(texts), dtype="float32")
+    # Normalised vectors + inner product == cosine similarity
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _split_pdf(path):
+    from langchain.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    pages = PyPDFLoader(path).load()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_documents(pages)
+    return [
+        {"source": os.path.basename(path), "page": c.metadata.get("page"), "text": c.page_content}
+        for c in chunks
+    ]
+
+
+def _read_chunks(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class MappedFlatIndex:
+    """Exact inner-product search over a memory-mapped vector matrix, with faiss's search() signature.
+
+    faiss reads a flat index file fully into the heap (faiss-cpu 1.7.4 can't mmap one), so
+    the flat index is served from kb_vectors.npy instead: startup reads nothing and every
+    worker process shares the same page-cache pages.
+    """
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.ntotal = len(vectors)
+
+    def search(self, queries, k):
+        scores = np.asarray(queries @ self.vectors.T, dtype="float32")
+        n = min(k, self.ntotal)
+        ids = np.argpartition(-scores, n - 1, axis=1)[:, :n] if n else np.empty((len(queries), 0), dtype="int64")
+        top = np.take_along_axis(scores, ids, axis=1)
+        order = np.argsort(-top, axis=1)
+        # Pad like faiss when k exceeds the number of vectors
+        out_scores = np.full((len(queries), k), -np.inf, dtype="float32")
+        out_ids = np.full((len(queries), k), -1, dtype="int64")
+        out_scores[:, :n] = np.take_along_axis(top, order, axis=1)
+        out_ids[:, :n] = np.take_along_axis(ids, order, axis=1)
+        return out_scores, out_ids
+
+
+def build_kb_index(data_dir=DATA_DIR, index_path=INDEX_PATH, chunks_path=CHUNKS_PATH, manifest_path=MANIFEST_PATH,
+                   vectors_path=VECTORS_PATH, index_type=None, index_params=None):
+    """Indexes every PDF in data_dir, re-embedding only PDFs whose hash changed.
+
+    index_type/index_params choose the FAISS index (flat, hnsw or ivfpq; defaults from
+    THYBOT_INDEX_TYPE / THYBOT_INDEX_PARAMS). The resolved parameters are saved in the
+    manifest. Returns a dict with the reused and re-embedded file names.
+    """
+    import faiss
+    # Changing chunking or the embedding backend invalidates every stored vector
+    params = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "model": embedding_model_id()}
+    old_manifest, old_chunks, old_vectors = {}, [], None
+    if all(os.path.exists(p) for p in (vectors_path, chunks_path, manifest_path)):
+        with open(manifest_path, encoding="utf-8") as f:
+            old_manifest = json.load(f)
+        if old_manifest.get("params") == params:
+            old_chunks = _read_chunks(chunks_path)
+            old_vectors = np.load(vectors_path, mmap_mode="r")
+        else:
+            old_manifest = {}
+
+    old_files = old_manifest.get("files", {})
+    pdfs = sorted(name for name in os.listdir(data_dir) if name.lower().endswith(".pdf"))
+
+    all_chunks, all_vectors, files = [], [], {}
+    reused, embedded = [], []
+    for name in pdfs:
+        path = os.path.join(data_dir, name)
+        digest = file_sha256(path)
+        entry = old_files.get(name)
+        if old_vectors is not None and entry and entry["sha256"] == digest:
+            start, count = entry["start"], entry["count"]
+            chunks = old_chunks[start:start + count]
+            vectors = np.array(old_vectors[start:start + count])
+            reused.append(name)
+        else:
+            chunks = _split_pdf(path)
+            vectors = _embed_texts([c["text"] for c in chunks]) if chunks else None
+            embedded.append(name)
+        files[name] = {"sha256": digest, "start": len(all_chunks), "count": len(chunks)}
+        all_chunks.extend(chunks)
+        if chunks:
+            all_vectors.append(vectors)
+
+    if not all_vectors:
+        raise ValueError(f"No PDF text found under {data_dir}")
+    matrix = np.vstack(all_vectors).astype("float32")
+    if index_type is None:
+        index_type, index_params = index_config_from_env()
+    index_config = resolve_index_params(index_type, len(matrix), index_params)
+    paths = [vectors_path, chunks_path, manifest_path]
+    if index_config["type"] != "flat":
+        index = make_faiss_index(matrix.shape[1], index_config, metric="ip", train_vectors=matrix)
+        index.add(matrix)
+        faiss.write_index(index, index_path + ".tmp")
+        paths.insert(0, index_path)
+
+    # Write to temp files and swap in so a running app never sees a half-built index
+    with open(vectors_path + ".tmp", "wb") as f:
+        np.save(f, matrix)
+    with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+        for c in all_chunks:
+            f.write(json.dumps(c, ensure_ascii=False) + "\n")
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"params": params, "index": index_config, "files": files}, f, indent=2)
+    for path in paths:
+        os.replace(path + ".tmp", path)
+    if index_config["type"] == "flat" and os.path.exists(index_path):
+        os.remove(index_path)  # Left by an earlier HNSW or IVF-PQ build
+    return {"reused": reused, "embedded": embedded, "chunks": len(all_chunks), "index": index_config}
+
+
+def load_kb_index(index_path=INDEX_PATH, chunks_path=CHUNKS_PATH, manifest_path=MANIFEST_PATH, vectors_path=VECTORS_PATH):
+    """Returns (index, chunks) for the bundled corpus, or None if it hasn't been built."""
+    if not os.path.exists(chunks_path):
+        return None
+    index_config = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            index_config = json.load(f).get("index", {})
+    if index_config.get("type") == "flat":
+        if not os.path.exists(vectors_path):
+            return None
+        index = MappedFlatIndex(np.load(vectors_path, mmap_mode="r"))
+    else:
+        if not os.path.exists(index_path):
+            return None
+        # HNSW and IVF-PQ indexes are compact enough to read into memory
+        import faiss
+        index = faiss.read_index(index_path)
+        apply_search_params(index, index_config)
+    return index, _read_chunks(chunks_path)
+
+
+def search_kb(query, kb, k=4):
+    import faiss
+    index, chunks = kb
+    with span("embed.query"):
+        query_vector = np.asarray([get_embedding_model().embed_query(query)], dtype="float32")
+    faiss.normalize_L2(query_vector)
+    with span("faiss.search"):
+        scores, ids = index.search(query_vector, k)
+    return [dict(chunks[i], score=float(s)) for s, i in zip(scores[0], ids[0]) if i != -1]
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+
+HYPO = "Hypothyroidism"
+HYPER = "Hyperthyroidism"
+NORMAL = "Normal"
+BORDERLINE = "Borderline / Consult Physician"
+
+# (low, high) reference range per analyte: TSH mIU/L, Free T3 pg/mL, Free T4 ng/dL
+DEFAULT_REFERENCE_RANGES = {"tsh": (0.4, 4.0), "t3": (2.3, 4.2), "t4": (0.8, 1.8)}
+
+
+def detect_thyroid_type(tsh, t3, t4, ranges=DEFAULT_REFERENCE_RANGES):
+    (tsh_lo, tsh_hi), (t3_lo, t3_hi), (t4_lo, t4_hi) = ranges["tsh"], ranges["t3"], ranges["t4"]
+    if tsh > tsh_hi and (t3 < t3_lo or t4 < t4_lo):
+        return HYPO
+    elif tsh < tsh_lo and (t3 > t3_hi or t4 > t4_hi):
+        return HYPER
+    elif tsh_lo <= tsh <= tsh_hi and t3_lo <= t3 <= t3_hi and t4_lo <= t4 <= t4_hi:
+        return NORMAL
+    else:
+        return BORDERLINE
+
+
+def classify_panels(tsh, t3, t4, ranges=DEFAULT_REFERENCE_RANGES):
+    """Vectorized detect_thyroid_type over arrays of lab values.
+
+    Range bounds may be scalars or per-row arrays (see ranges_for_labs). Missing
+    values compare False everywhere, so they land in BORDERLINE just like the
+    scalar function.
+    """
+    tsh, t3, t4 = (np.asarray(v, dtype=np.float64) for v in (tsh, t3, t4))
+    (tsh_lo, tsh_hi), (t3_lo, t3_hi), (t4_lo, t4_hi) = ranges["tsh"], ranges["t3"], ranges["t4"]
+    hypo = (tsh > tsh_hi) & ((t3 < t3_lo) | (t4 < t4_lo))
+    hyper = (tsh < tsh_lo) & ((t3 > t3_hi) | (t4 > t4_hi))
+    normal = (tsh_lo <= tsh) & (tsh <= tsh_hi) & (t3_lo <= t3) & (t3 <= t3_hi) & (t4_lo <= t4) & (t4 <= t4_hi)
+    return np.select([hypo, hyper, normal], [HYPO, HYPER, NORMAL], default=BORDERLINE)
+
+
+def ranges_for_labs(labs, lab_ranges, default=DEFAULT_REFERENCE_RANGES):
+    """Expands {lab name: ranges} into per-row bound arrays for classify_panels."""
+    import pandas as pd
+
+    labs = pd.Series(labs)
+    expanded = {}
+    for analyte in ("tsh", "t3", "t4"):
+        bounds = []
+        for side in (0, 1):
+            per_lab = {lab: r[analyte][side] for lab, r in lab_ranges.items() if analyte in r}
+            bounds.append(labs.map(per_lab).fillna(default[analyte][side]).to_numpy(dtype=np.float64))
+        expanded[analyte] = tuple(bounds)
+    return expanded
+
+
+def load_reference_ranges(path):
+    """Reads {"default": {...}, "<lab>": {"tsh": [lo, hi], ...}} from a JSON file.
+
+    Returns (default ranges, {lab: ranges}); analytes a lab doesn't list use the default.
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    default = dict(DEFAULT_REFERENCE_RANGES, **{k: tuple(v) for k, v in config.pop("default", {}).items()})
+    labs = {lab: {k: tuple(v) for k, v in r.items()} for lab, r in config.items()}
+    return default, labs
+
+
+def classify_frame(df, columns=("TSH", "T3", "T4"), lab_column=None, lab_ranges=None, ranges=DEFAULT_REFERENCE_RANGES):
+    """Adds a Thyroid_Type column to a DataFrame of lab panels and returns it."""
+    import pandas as pd
+
+    tsh_col, t3_col, t4_col = columns
+    if lab_column and lab_ranges:
+        ranges = ranges_for_labs(df[lab_column], lab_ranges, default=ranges)
+    # Non-numeric entries ("<0.01", blanks) become NaN and classify as borderline
+    values = [pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64) for c in (tsh_col, t3_col, t4_col)]
+    df["Thyroid_Type"] = classify_panels(*values, ranges=ranges)
+    return df
+
+
+def classify_csv_chunks(source, chunksize=100_000, **kwargs):
+    """Streams a CSV (path or file object) and yields classified DataFrame chunks."""
+    import pandas as pd
+
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        yield classify_frame(chunk, **kwargs)
@@ -0,0 +1,99 @@
+import inspect
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_CACHE_DIR = os.environ.get("THYBOT_ONNX_CACHE_DIR", os.path.join(".cache", "onnx"))
+# all-MiniLM-L6-v2 was trained with 256-token inputs; sentence-transformers truncates there too
+MAX_SEQ_LENGTH = 256
+
+
+def export_onnx(model_name, quantize=False, cache_dir=ONNX_CACHE_DIR):
+    """Exports the Hugging Face encoder to ONNX once (and int8-quantizes it) and returns the file path."""
+    model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(model_dir, exist_ok=True)
+        hf_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        tokenizer = AutoTokenizer.from_pretrained(hf_name)
+        model = AutoModel.from_pretrained(hf_name).eval()
+
+        class Encoder(torch.nn.Module):
+            # Keyword call, so the export doesn't depend on forward()'s positional order
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                  token_type_ids=token_type_ids).last_hidden_state
+
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        dynamic = {0: "batch", 1: "sequence"}
+        tmp_path = fp32_path + ".tmp"
+        # Newer torch defaults to the dynamo exporter (needs onnxscript); the TorchScript one suffices here
+        legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                Encoder(model),
+                (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+                tmp_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "token_type_ids": dynamic,
+                              "last_hidden_state": dynamic},
+                opset_version=14,
+                **legacy,
+            )
+        os.replace(tmp_path, fp32_path)
+        tokenizer.save_pretrained(model_dir)
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, int8_path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(int8_path + ".tmp", int8_path)
+    return int8_path if quantize else fp32_path
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """Sentence-transformers MiniLM (mean pooling + L2 normalisation) run through ONNX Runtime on CPU."""
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", quantize=False, batch_size=32, num_threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = export_onnx(model_name, quantize=quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(path))
+        self.batch_size = batch_size
+
+    def _encode(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+        hidden = self.session.run(None, feeds)[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        # Batch texts of similar length together to keep padding down, then restore order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            ids = order[start:start + self.batch_size]
+            for i, vector in zip(ids, self._encode([texts[i] for i in ids])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
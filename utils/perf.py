@@ -0,0 +1,131 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the exported latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Recent samples kept per (page, stage) for percentiles
+SAMPLE_WINDOW = 1000
+
+_current_trace = contextvars.ContextVar("thybot_trace", default=None)
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+class StageHistogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentile(self, p):
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+
+class Trace:
+    """The stage timings of one page run, in the order they finished."""
+
+    def __init__(self, page):
+        self.page = page
+        self.spans = []
+
+    def breakdown(self):
+        """{stage: (calls, total seconds)} in first-seen order."""
+        stages = {}
+        for stage, seconds in list(self.spans):
+            calls, total = stages.get(stage, (0, 0.0))
+            stages[stage] = (calls + 1, total + seconds)
+        return stages
+
+
+def start_trace(page):
+    """Starts a trace that spans in this context (and contexts copied from it) are added to."""
+    trace = Trace(page)
+    _current_trace.set(trace)
+    return trace
+
+
+def ensure_trace(page):
+    """The current trace, or a new one for page if nothing has started one (e.g. an API request)."""
+    return _current_trace.get() or start_trace(page)
+
+
+def record(stage, seconds):
+    trace = _current_trace.get()
+    page = trace.page if trace else "background"
+    with _histograms_lock:
+        _histograms.setdefault((page, stage), StageHistogram()).observe(seconds)
+    if trace is not None:
+        trace.spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed_stream(stage, iterable):
+    """Passes iterable through, recording <stage>.first_token and <stage> (until exhausted or closed)."""
+    start = time.perf_counter()
+    first = True
+    try:
+        for item in iterable:
+            if first:
+                record(f"{stage}.first_token", time.perf_counter() - start)
+                first = False
+            yield item
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def in_current_context(fn):
+    """Wraps fn so it runs in a copy of the caller's context, e.g. when submitted to a thread pool."""
+    context = contextvars.copy_context()
+    # A context can only be entered by one thread at a time, so each call runs in its own copy
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def export_json():
+    """{page: {stage: {count, sum, p50, p95, buckets: {le: cumulative count}}}}"""
+    with _histograms_lock:
+        out = {}
+        for (page, stage), h in sorted(_histograms.items()):
+            cumulative, buckets = 0, {}
+            for bound, n in zip(LATENCY_BUCKETS, h.bucket_counts):
+                cumulative += n
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = h.count
+            out.setdefault(page, {})[stage] = {
+                "count": h.count, "sum": h.total, "p50": h.percentile(0.50), "p95": h.percentile(0.95), "buckets": buckets,
+            }
+    return out
+
+
+def export_prometheus(metric="thybot_stage_seconds"):
+    """The histograms in Prometheus text exposition format."""
+    lines = [f"# HELP {metric} Time spent per page and stage.", f"# TYPE {metric} histogram"]
+    for page, stages in export_json().items():
+        for stage, h in stages.items():
+            labels = f'page="{page}",stage="{stage}"'
+            for bound, n in h["buckets"].items():
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f"{metric}_sum{{{labels}}} {h['sum']:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {h['count']}")
+    return "\n".join(lines) + "\n"
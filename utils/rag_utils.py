@@ -1,15 +1,52 @@
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-from langchain.document_loaders import PyPDFLoader
-from sentence_transformers import SentenceTransformer
+from collections import Counter, defaultdict
+from functools import lru_cache
+import heapq
+import json
+import math
+import os
+import re
 import tempfile
 
-# Load embedding model once
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+from utils.perf import span
+
+# langchain, faiss and sentence-transformers (torch) are imported on first use so that
+# pages which never embed anything don't pay for them at startup.
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# "torch" (sentence-transformers) or "onnx" (ONNX Runtime, see utils/onnx_embeddings.py)
+EMBEDDING_BACKEND = os.environ.get("THYBOT_EMBEDDING_BACKEND", "torch").lower()
+# ONNX only: dynamic int8 quantization of the weights
+EMBEDDING_QUANTIZE = os.environ.get("THYBOT_EMBEDDING_QUANTIZE", "").lower() in ("1", "true", "int8")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("THYBOT_EMBEDDING_BATCH_SIZE", "32"))
+# 0 leaves the thread count to torch / ONNX Runtime
+EMBEDDING_THREADS = int(os.environ.get("THYBOT_EMBEDDING_THREADS", "0"))
+
+@lru_cache(maxsize=None)
+def get_embedding_model(backend=None, quantize=None):
+    # Load embedding model once per process (per backend), shared by every session
+    backend = backend or EMBEDDING_BACKEND
+    quantize = EMBEDDING_QUANTIZE if quantize is None else quantize
+    if backend == "onnx":
+        from utils.onnx_embeddings import OnnxMiniLMEmbeddings
+        return OnnxMiniLMEmbeddings(EMBEDDING_MODEL_NAME, quantize=quantize,
+                                    batch_size=EMBEDDING_BATCH_SIZE, num_threads=EMBEDDING_THREADS)
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected 'torch' or 'onnx'")
+    from langchain.embeddings import HuggingFaceEmbeddings
+    if EMBEDDING_THREADS:
+        import torch
+        torch.set_num_threads(EMBEDDING_THREADS)
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE})
+
+def embedding_model_id():
+    """Identifies the vectors the configured backend produces, for cache keys."""
+    if EMBEDDING_BACKEND == "onnx":
+        return f"{EMBEDDING_MODEL_NAME}:onnx{'-int8' if EMBEDDING_QUANTIZE else ''}"
+    return EMBEDDING_MODEL_NAME
 
 def load_and_split_pdf(uploaded_file):
+    from langchain.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
     with tempfile.NamedTemporaryFile(delete=False) as tmp:
         tmp.write(uploaded_file.read())
         tmp_path = tmp.name
@@ -19,8 +56,208 @@ def load_and_split_pdf(uploaded_file):
     chunks = splitter.split_documents(pages)
     return chunks
 
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+def tokenize(text):
+    # Keeps lab terms and cutoffs whole: "anti-tpo", "t4", "4.5"
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Lexical inverted index over chunk text, scored with Okapi BM25. Supports incremental adds."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc id, term frequency)]
+        self.doc_lengths = []
+        self.total_length = 0
+
+    def add(self, texts):
+        for text in texts:
+            doc_id = len(self.doc_lengths)
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc_id, tf))
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+
+    def search(self, query, k=10):
+        """Returns [(doc id, score)] best first."""
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+class HybridIndex:
+    """A FAISS vector store plus a BM25 index over the same chunks, kept in step."""
+
+    def __init__(self, vectorstore, chunks):
+        self.vectorstore = vectorstore
+        self.chunks = list(chunks)
+        self.bm25 = BM25Index()
+        self.bm25.add(c.page_content for c in self.chunks)
+
+    def add(self, chunks, vectors):
+        self.vectorstore.add_embeddings(
+            [(c.page_content, list(map(float, v))) for c, v in zip(chunks, vectors)],
+            metadatas=[c.metadata for c in chunks],
+        )
+        self.chunks.extend(chunks)
+        self.bm25.add(c.page_content for c in chunks)
+
+    def similarity_search(self, query, k=4):
+        with span("embed.query"):
+            vector = get_embedding_model().embed_query(query)
+        with span("faiss.search"):
+            return self.vectorstore.similarity_search_by_vector(vector, k=k)
+
+    def keyword_search(self, query, k=4):
+        with span("bm25.search"):
+            return [self.chunks[doc_id] for doc_id, _ in self.bm25.search(query, k=k)]
+
+# ------------------ INDEX FACTORY ------------------
+# "flat" is exact search. "hnsw" is a graph index: fast, uncompressed. "ivfpq" clusters the
+# vectors and stores product-quantized codes: far smaller, approximate, needs training.
+DEFAULT_INDEX_PARAMS = {
+    "flat": {},
+    "hnsw": {"M": 32, "ef_construction": 80, "ef_search": 64},
+    "ivfpq": {"nlist": None, "m": 16, "nbits": 8, "nprobe": 8},
+}
+# IVF-PQ needs this many training vectors per centroid; with fewer we fall back to flat
+MIN_TRAIN_POINTS_PER_CENTROID = 8
+# Types that are trained on the vectors, so they can only be built once all of them are known
+TRAINED_INDEX_TYPES = {"ivfpq"}
+
+def index_config_from_env():
+    """Index type and params for this deployment, e.g. THYBOT_INDEX_TYPE=hnsw THYBOT_INDEX_PARAMS='{"M": 16}'."""
+    kind = os.environ.get("THYBOT_INDEX_TYPE", "flat").lower()
+    params = json.loads(os.environ.get("THYBOT_INDEX_PARAMS", "{}"))
+    return kind, params
+
+def resolve_index_params(kind, n_vectors, params=None):
+    """Fills in defaults and derived values; returns {"type": ..., **params} ready to persist."""
+    if kind not in DEFAULT_INDEX_PARAMS:
+        raise ValueError(f"Unknown index type {kind!r}; expected one of {', '.join(DEFAULT_INDEX_PARAMS)}")
+    resolved = dict(DEFAULT_INDEX_PARAMS[kind], **(params or {}))
+    if kind == "ivfpq":
+        if not resolved["nlist"]:
+            resolved["nlist"] = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+        needed = max(resolved["nlist"], 2 ** resolved["nbits"]) * MIN_TRAIN_POINTS_PER_CENTROID
+        if n_vectors < needed:
+            return {"type": "flat", "fallback_from": "ivfpq"}
+    return {"type": kind, **resolved}
+
+def make_faiss_index(dim, params, metric="l2", train_vectors=None):
+    """Returns an empty FAISS index for resolved params, trained on train_vectors when needed."""
+    import faiss
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+    kind = params["type"]
+    if kind == "flat":
+        return faiss.IndexFlatIP(dim) if metric == "ip" else faiss.IndexFlatL2(dim)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["M"], faiss_metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+    elif kind == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim) if metric == "ip" else faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["m"], params["nbits"], faiss_metric)
+        index.train(train_vectors)
+    apply_search_params(index, params)
+    return index
+
+def apply_search_params(index, params):
+    """Sets query-time knobs (not all are stored in the index file)."""
+    import faiss
+    if params.get("type") == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = params["ef_search"]
+    elif params.get("type") == "ivfpq":
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+
 def embed_chunks(chunks):
-    return FAISS.from_documents(chunks, embedding_model)
+    from langchain.vectorstores import FAISS
+    return HybridIndex(FAISS.from_documents(chunks, get_embedding_model()), chunks)
+
+def embed_texts(texts):
+    with span("embed.documents"):
+        return get_embedding_model().embed_documents(texts)
+
+def build_index(chunks, vectors, kind=None, params=None):
+    """Builds the index from precomputed vectors, skipping the embedding pass.
+
+    kind/params pick the FAISS index type (see DEFAULT_INDEX_PARAMS); by default they
+    come from THYBOT_INDEX_TYPE / THYBOT_INDEX_PARAMS.
+    """
+    import numpy as np
+    from langchain.vectorstores import FAISS
+    if kind is None:
+        kind, params = index_config_from_env()
+    text_embeddings = [(c.page_content, list(map(float, v))) for c, v in zip(chunks, vectors)]
+    metadatas = [c.metadata for c in chunks]
+    resolved = resolve_index_params(kind, len(chunks), params)
+    if resolved["type"] == "flat":
+        vectorstore = FAISS.from_embeddings(text_embeddings, get_embedding_model(), metadatas=metadatas)
+    else:
+        from langchain.docstore.in_memory import InMemoryDocstore
+        matrix = np.asarray(vectors, dtype="float32")
+        index = make_faiss_index(matrix.shape[1], resolved, train_vectors=matrix)
+        vectorstore = FAISS(get_embedding_model(), index, InMemoryDocstore({}), {})
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+    return HybridIndex(vectorstore, chunks)
+
+def _shingles(text, n=5):
+    words = tokenize(text)
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+def _overlap_length(previous, text, min_overlap=50, max_overlap=400):
+    # Length of the longest suffix of previous that text starts with (the splitter's chunk_overlap)
+    for size in range(min(len(previous), len(text), max_overlap), min_overlap - 1, -1):
+        if previous.endswith(text[:size]):
+            return size
+    return 0
+
+def dedupe_chunks(docs, k=None, max_containment=0.8):
+    """Keeps up to k chunks, dropping any mostly contained in an earlier one and trimming text repeated by chunk overlap."""
+    from langchain.docstore.document import Document
+    kept, kept_shingles = [], []
+    for doc in docs:
+        if k is not None and len(kept) >= k:
+            break
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) >= max_containment * len(shingles) for other in kept_shingles):
+            continue
+        text = doc.page_content
+        for other in kept:
+            overlap = _overlap_length(other.page_content, text)
+            if overlap:
+                text = text[overlap:].lstrip()
+        kept.append(Document(page_content=text, metadata=doc.metadata) if text != doc.page_content else doc)
+        kept_shingles.append(shingles)
+    return kept
+
+RRF_K = 60
+
+def retrieve_relevant_chunks(query, index, k=4, candidates=20):
+    """Fuses vector and BM25 rankings with reciprocal rank fusion, then de-duplicates.
 
-def retrieve_relevant_chunks(query, faiss_index, k=4):
-    return faiss_index.similarity_search(query, k=k)
+    Plain FAISS stores (no keyword index) fall back to similarity search.
+    """
+    if not isinstance(index, HybridIndex):
+        return index.similarity_search(query, k=k)
+    fused, docs = defaultdict(float), {}
+    for ranking in (index.similarity_search(query, k=candidates), index.keyword_search(query, k=candidates)):
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            fused[key] += 1 / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+    with span("retrieval.fuse"):
+        ranked = [docs[key] for key in sorted(fused, key=fused.get, reverse=True)]
+        return dedupe_chunks(ranked, k=k)
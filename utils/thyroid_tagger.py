@@ -0,0 +1,90 @@
+import os
+import re
+
+GOITROGENIC = ["cabbage", "cauliflower", "spinach", "broccoli", "mustard", "soy", "tofu", "peanut", "radish"]
+THYROID_SUPPORTIVE = ["fish", "egg", "milk", "yogurt", "curd", "cheese", "iodized salt", "brazil nut", "almond", "cashew"]
+
+GOITROGENIC_LABEL = "Goitrogenic – Limit in Hypothyroidism"
+SUPPORTIVE_LABEL = "Thyroid Supportive – Good for Thyroid Health"
+NEUTRAL_LABEL = "Neutral – No major thyroid impact"
+
+
+def _compile(keywords):
+    # One alternation per category; longest first so multi-word keywords win
+    return re.compile("|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)))
+
+
+GOITROGENIC_RE = _compile(GOITROGENIC)
+SUPPORTIVE_RE = _compile(THYROID_SUPPORTIVE)
+
+
+def tag_thyroid_impact(food):
+    """Tags a single dish name. Goitrogenic keywords take priority over supportive ones."""
+    f = str(food).lower()
+    if GOITROGENIC_RE.search(f):
+        return GOITROGENIC_LABEL
+    elif SUPPORTIVE_RE.search(f):
+        return SUPPORTIVE_LABEL
+    else:
+        return NEUTRAL_LABEL
+
+
+def tag_series(names):
+    """Vectorized tagger for a pandas Series of dish names.
+
+    Each distinct name is matched once, which matters for composition tables where
+    the same dish appears thousands of times.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(names.astype(str).str.lower(), use_na_sentinel=False)
+    uniques = pd.Series(uniques)
+    labels = np.select(
+        [uniques.str.contains(GOITROGENIC_RE, regex=True), uniques.str.contains(SUPPORTIVE_RE, regex=True)],
+        [GOITROGENIC_LABEL, SUPPORTIVE_LABEL],
+        default=NEUTRAL_LABEL,
+    )
+    return pd.Series(labels[codes], index=names.index, name="Thyroid_Impact")
+
+
+def tag_csv(input_path, output_path, column="Dish Name", chunksize=100_000):
+    """Streams input_path in chunks, adds a Thyroid_Impact column and writes output_path.
+
+    The output format follows the extension (.parquet or .csv). Values are copied as text,
+    so the Parquet schema is fixed from the header and can't drift when a sparse column
+    only shows its real type in a later chunk. The input is never modified and any
+    existing Thyroid_Impact column is recomputed, so reruns give the same output.
+    Returns the number of rows written.
+    """
+    import pandas as pd
+
+    parquet = output_path.lower().endswith(".parquet")
+    tmp_path = output_path + ".tmp"
+    writer = None
+    rows = 0
+    try:
+        for i, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize, dtype="string")):
+            chunk["Thyroid_Impact"] = tag_series(chunk[column])
+            if parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                if writer is None:
+                    schema = pa.schema([pa.field(name, pa.string()) for name in chunk.columns])
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+            else:
+                chunk.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            rows += len(chunk)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if writer is not None:
+        writer.close()
+    if not os.path.exists(tmp_path):
+        raise ValueError(f"No rows found in {input_path}")
+    os.replace(tmp_path, output_path)
+    return rows
@@ -1,8 +1,48 @@
-from duckduckgo_search import DDGS
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from models.llm import get_groq_model
+from utils.perf import in_current_context, span
+
+SEARCH_CACHE_TTL = 60 * 60  # seconds
+SEARCH_CACHE_MAX_ENTRIES = 1024
+
+# normalized query -> (expiry, results); shared by every session in the process
+_search_cache = {}
+_search_cache_lock = threading.Lock()
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="web-search")
+
+def normalize_query(query):
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+def _cache_get(key):
+    with _search_cache_lock:
+        entry = _search_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        _search_cache.pop(key, None)
+        return None
+
+def _cache_put(key, results):
+    with _search_cache_lock:
+        if len(_search_cache) >= SEARCH_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for k in [k for k, (expiry, _) in _search_cache.items() if expiry <= now]:
+                del _search_cache[k]
+            if len(_search_cache) >= SEARCH_CACHE_MAX_ENTRIES:
+                # Still full: drop the entry closest to expiry
+                del _search_cache[min(_search_cache, key=lambda k: _search_cache[k][0])]
+        _search_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL, results)
 
 def perform_web_search(query, max_results=5):
-    with DDGS() as ddgs:
+    key = (normalize_query(query), max_results)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    from duckduckgo_search import DDGS
+    with span("web.search"), DDGS() as ddgs:
         results = ddgs.text(query, max_results=max_results)
         out = []
         for r in results:
@@ -11,7 +51,13 @@ def perform_web_search(query, max_results=5):
                 "snippet": r.get("body", "No description available."),
                 "link": r.get("href", "#")
             })
-        return out
+    if out:
+        _cache_put(key, out)
+    return out
+
+def start_web_search(query, max_results=5):
+    """Runs perform_web_search in the background and returns a Future for its results."""
+    return _search_pool.submit(in_current_context(perform_web_search), query, max_results)
 
 def get_completion(prompt):
     try:
@@ -20,4 +66,3 @@ def get_completion(prompt):
         return resp.content if hasattr(resp, "content") else str(resp)
     except Exception as e:
         return f"⚠️ Failed to summarize: {e}"
-